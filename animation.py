@@ -0,0 +1,243 @@
+from clock import call_later, monotonic, sleep
+from contextlib import contextmanager
+from metrics import Histogram
+from threading import active_count, Event, RLock
+import time
+
+# Constants
+
+FLASH_STEPS = [(False, 0.1), (True, 0.5), (False, 0.1)]
+STRIKE_STEPS = [(False, 0.1), (True, 0.1)] * 3 + [(False, 0.1)]
+
+# Variables
+
+frame_drift = Histogram('animation_frame_drift_seconds', 'How late the frames of inline animations were written.')
+
+# Classes
+
+class Schedule(object):
+
+  def __init__(self, frames, duration, repeat=False):
+    self.frames = sorted(frames, key=lambda f: f[0])
+    self.frames.append((duration, ()))
+    self.duration = duration
+    self.repeat = repeat
+    self.leds = set(led for offset, writes in frames for led, state in writes)
+
+class Animation(object):
+
+  def __init__(self, schedule, started_at):
+    self.schedule = schedule
+    self.started_at = started_at
+    self.index = 0
+    self.leds = set(schedule.leds)
+    self.call = None
+    self.finished = Event()
+
+  def done(self):
+    return self.finished.is_set()
+
+class Animator(object):
+
+  def __init__(self):
+    self.lock = RLock()
+    self.owners = {}
+    self.drawing = False
+
+  def play(self, schedule):
+    with self.lock:
+      self.stop(schedule.leds)
+      animation = Animation(schedule, monotonic())
+      for led in schedule.leds:
+        self.owners[led] = animation
+      self._draw(animation)
+    return animation
+
+  def stop(self, leds):
+    with self.lock:
+      for led in leds:
+        animation = self.owners.pop(led, None)
+        if animation is None:
+          continue
+        animation.leds.discard(led)
+        if len(animation.leds) == 0:
+          self._finish(animation)
+
+  def _draw(self, animation):
+    with self.lock:
+      if animation.done():
+        return
+      schedule = animation.schedule
+      frames = schedule.frames
+      now = monotonic()
+      while animation.started_at + frames[animation.index][0] <= now:
+        self.drawing = True
+        try:
+          for led, state in frames[animation.index][1]:
+            if self.owners.get(led) is animation:
+              led.pin.state = state
+        finally:
+          self.drawing = False
+        animation.index += 1
+        if animation.index == len(frames):
+          if not schedule.repeat:
+            for led in list(animation.leds):
+              self.owners.pop(led, None)
+            self._finish(animation)
+            return
+          animation.started_at += schedule.duration
+          animation.index = 0
+      due = animation.started_at + frames[animation.index][0]
+      animation.call = call_later(due - now, self._draw, (animation,))
+
+  def _finish(self, animation):
+    if animation.call is not None:
+      animation.call.cancel()
+    animation.leds.clear()
+    animation.finished.set()
+
+# Functions
+
+def blink(leds, on_time=1, off_time=1, n=None):
+  frames = []
+  for i in range(1 if n is None else n):
+    start = i * (on_time + off_time)
+    frames.append((start, tuple((led, True) for led in leds)))
+    frames.append((start + on_time, tuple((led, False) for led in leds)))
+  return Schedule(frames, (1 if n is None else n) * (on_time + off_time), n is None)
+
+def steps(leds, states):
+  frames = []
+  offset = 0
+  for state, hold in states:
+    frames.append((offset, tuple((led, state) for led in leds)))
+    offset += hold
+  return Schedule(frames, offset)
+
+def sequence(leds, on_time, gap=0):
+  frames = []
+  offset = 0
+  for i, led in enumerate(leds):
+    offset = i * (on_time + gap)
+    frames.append((offset, ((led, True),)))
+    frames.append((offset + on_time, ((led, False),)))
+  return Schedule(frames, offset + on_time if len(frames) > 0 else 0)
+
+def flash(leds):
+  return steps(leds, FLASH_STEPS)
+
+def strike(leds):
+  return steps(leds, STRIKE_STEPS)
+
+def combine(*schedules):
+  frames = [f for s in schedules for f in s.frames[:-1]]
+  return Schedule(frames, max(s.duration for s in schedules), any(s.repeat for s in schedules))
+
+def compare(current, target):
+  schedules = [Schedule([], 0)]
+  if current is not None:
+    schedules.append(blink([current], 0.5, 0.5, 1))
+  if target is not None:
+    schedules.append(blink([target], 0.25, 0.25, 2))
+  return combine(*schedules)
+
+def play(schedule):
+  return animator.play(schedule)
+
+def stop(leds):
+  animator.stop(leds)
+
+@contextmanager
+def paused():
+  with animator.lock:
+    animator.drawing = True
+    try:
+      yield
+    finally:
+      animator.drawing = False
+
+def run(schedule):
+  animator.stop(schedule.leds)
+  drift = frame_drift.labels()
+  started_at = monotonic()
+  latest = 0
+  for frame_offset, writes in schedule.frames:
+    remaining = started_at + frame_offset - monotonic()
+    if remaining > 0:
+      sleep(remaining)
+    late = monotonic() - started_at - frame_offset
+    for led, state in writes:
+      led.pin.state = state
+    drift.observe(late)
+    latest = max(latest, late)
+  return latest
+
+def measure(leds, start, half_period, duration):
+  for led in leds:
+    led.pin.clear_states()
+  threads = active_count()
+  start(leds)
+  time.sleep(half_period / 2)
+  threads = active_count() - threads
+  time.sleep(duration)
+  for led in leds:
+    stop([led])
+    led.off()
+  errors = []
+  for led in leds:
+    intervals = [s.timestamp for s in led.pin.states[2:-1]]
+    errors.extend(abs(i - half_period) for i in intervals)
+  errors.sort()
+  return threads, errors[len(errors) // 2], errors[int(len(errors) * 0.99)], max(errors)
+
+def sequence_drift(leds, play, on_time, steps):
+  picks = [leds[i % len(leds)] for i in range(steps)]
+  for led in leds:
+    led.pin.clear_states()
+  play(picks, on_time)
+  writes = []
+  for led in leds:
+    changed_at = 0
+    for s in led.pin.states[1:]:
+      changed_at += s.timestamp
+      writes.append(changed_at)
+  writes.sort()
+  return max(abs(t - writes[0] - (i + 1) // 2 * on_time) for i, t in enumerate(writes))
+
+def play_relative(picks, on_time):
+  for led in picks:
+    led.on()
+    time.sleep(on_time)
+    led.off()
+
+def benchmark(numbers, half_period=0.02, duration=2):
+  from gpiozero import LED
+  leds = [LED(n) for n in numbers]
+  results = {
+    'gpiozero': measure(leds, lambda l: [led.blink(half_period, half_period) for led in l], half_period, duration),
+    'animator': measure(leds, lambda l: play(blink(l, half_period, half_period)), half_period, duration)
+  }
+  for steps in (10, 50):
+    results['sleep per flash, {} steps'.format(steps)] = sequence_drift(leds, play_relative, half_period, steps)
+    results['deadlines, {} steps'.format(steps)] = sequence_drift(leds, lambda p, t: run(sequence(p, t)), half_period, steps)
+  for led in leds:
+    led.close()
+  return results
+
+animator = Animator()
+
+# Main
+
+if __name__ == '__main__':
+  from gpiozero import Device
+  from gpiozero.pins.mock import MockFactory
+  Device.pin_factory = MockFactory()
+  numbers = [4, 17, 27, 22, 10, 9, 11, 0, 5, 6, 13, 19, 23, 24, 18]
+  results = benchmark(numbers)
+  print('{:<10} {:>8} {:>12} {:>12} {:>12}'.format('Blink', 'Threads', 'Jitter p50', 'Jitter p99', 'Jitter max'))
+  for name in ['gpiozero', 'animator']:
+    threads, p50, p99, worst = results.pop(name)
+    print('{:<10} {:>8} {:>10.2f}ms {:>10.2f}ms {:>10.2f}ms'.format(name, threads, p50 * 1000, p99 * 1000, worst * 1000))
+  print('{:<28} {:>12}'.format('Sequence playback', 'Max drift'))
+  for name, drift in results.items():
+    print('{:<28} {:>10.2f}ms'.format(name, drift * 1000))
@@ -0,0 +1,107 @@
+from clock import call_later, sleep
+from concurrent.futures import Future
+from metrics import Counter, Histogram
+from pygame import mixer
+from threading import RLock
+
+# Constants
+
+DIALOG = 'dialog'
+SFX = 'sfx'
+BACKGROUND = 0
+CUE = 1
+RESULT = 2
+CHANNELS = {DIALOG: 0, SFX: 1}
+MAX_VOICES = 8
+RESERVED_CHANNELS = 2
+
+# Variables
+
+playing = {}
+skip_playback = False
+scheduler_lock = RLock()
+play_seconds = Histogram('sound_play_seconds', 'Time to start playing a sound on a mixer channel.', ('kind',))
+dropped_sounds = Counter('sounds_dropped_total', 'Sounds not played because every channel was busy with a higher priority.', ('kind',))
+
+# Functions
+
+def setup_channels():
+  mixer.set_num_channels(MAX_VOICES)
+  mixer.set_reserved(RESERVED_CHANNELS)
+
+def play_sound(sound, kind=SFX, priority=BACKGROUND, callback=None):
+  future = Future()
+  if callback is not None:
+    future.add_done_callback(callback)
+  if skip_playback:
+    future.set_result(False)
+    return future
+  with scheduler_lock:
+    channel_id = select_channel(kind, priority)
+    if channel_id is None:
+      dropped_sounds.labels(kind).inc()
+      future.set_result(False)
+      return future
+    release_channel(channel_id)
+    with play_seconds.labels(kind).time():
+      mixer.Channel(channel_id).play(sound)
+    timer = call_later(sound.get_length(), finish_channel, (channel_id, future))
+    playing[channel_id] = (future, priority, timer)
+  return future
+
+def select_channel(kind, priority):
+  channel_id = CHANNELS[kind]
+  if channel_id not in playing:
+    return channel_id
+  if kind == SFX:
+    for c in range(RESERVED_CHANNELS, MAX_VOICES):
+      if c not in playing:
+        return c
+  if playing[channel_id][1] > priority:
+    return None
+  return channel_id
+
+def release_channel(channel_id):
+  current = playing.pop(channel_id, None)
+  if current is None:
+    return
+  future, priority, timer = current
+  timer.cancel()
+  mixer.Channel(channel_id).stop()
+  if not future.done():
+    future.set_result(False)
+
+def finish_channel(channel_id, future):
+  with scheduler_lock:
+    current = playing.get(channel_id)
+    if current is not None and current[0] is future:
+      del playing[channel_id]
+  if not future.done():
+    future.set_result(True)
+
+def stop_sound(future):
+  with scheduler_lock:
+    for channel_id, current in list(playing.items()):
+      if current[0] is future:
+        release_channel(channel_id)
+
+def skip(kind=None):
+  with scheduler_lock:
+    for c in list(playing):
+      if kind is None or c == CHANNELS[kind]:
+        release_channel(c)
+
+def wait_for_release(button):
+  while button.is_pressed:
+    sleep(0.01)
+
+def wait_for_completion(future, skip_button=None):
+  if skip_button is not None:
+    wait_for_release(skip_button)
+  while not future.done():
+    if skip_button is not None and skip_button.is_pressed:
+      stop_sound(future)
+      wait_for_release(skip_button)
+      break
+    sleep(0.01)
+  return future.result()
@@ -0,0 +1,84 @@
+from heapq import heappop, heappush
+from itertools import count
+from threading import Condition, Thread
+from traceback import print_exc
+import time
+
+# Classes
+
+class ScheduledCall(object):
+
+  def __init__(self, function, args):
+    self.function = function
+    self.args = args
+    self.cancelled = False
+
+  def cancel(self):
+    self.cancelled = True
+
+class RealClock(object):
+
+  def __init__(self):
+    self.calls = []
+    self.counter = count()
+    self.condition = Condition()
+    self.thread = None
+
+  def monotonic(self):
+    return time.monotonic()
+
+  def sleep(self, seconds):
+    time.sleep(seconds)
+
+  def wait(self, event, timeout=None):
+    return event.wait(timeout)
+
+  def call_later(self, delay, function, args=()):
+    call = ScheduledCall(function, args)
+    with self.condition:
+      heappush(self.calls, (time.monotonic() + max(delay, 0), next(self.counter), call))
+      if self.thread is None:
+        self.thread = Thread(target=self._run, name='clock')
+        self.thread.daemon = True
+        self.thread.start()
+      self.condition.notify()
+    return call
+
+  def _run(self):
+    while True:
+      with self.condition:
+        while True:
+          if len(self.calls) == 0:
+            self.condition.wait()
+            continue
+          remaining = self.calls[0][0] - time.monotonic()
+          if remaining <= 0:
+            call = heappop(self.calls)[2]
+            break
+          self.condition.wait(remaining)
+      if call.cancelled:
+        continue
+      try:
+        call.function(*call.args)
+      except Exception:
+        print_exc()
+
+# Functions
+
+def use_clock(clock):
+  global current
+  current = clock
+
+def monotonic():
+  return current.monotonic()
+
+def sleep(seconds):
+  current.sleep(seconds)
+
+def wait(event, timeout=None):
+  return current.wait(event, timeout)
+
+def call_later(delay, function, args=()):
+  return current.call_later(delay, function, args)
+
+current = RealClock()
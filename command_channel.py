@@ -0,0 +1,218 @@
+from argparse import ArgumentParser
+from collections import namedtuple
+from connectivity import connection
+from firebase import database_auth, db, OPTS, RestDatabase
+from http_pool import ConnectionPool
+from json import dumps, loads
+from metrics import Histogram
+from queue import Empty, Queue
+from threading import Event, Thread
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+from uuid import uuid4
+import time
+
+# Constants
+
+DATABASE_URL = OPTS['databaseURL']
+COMMAND_PATH = 'command'
+ACK_PATH = 'command_ack'
+COMMANDS = ['start', 'stop', 'reset']
+DONE = 'done'
+IGNORED = 'ignored'
+RECONNECT_INTERVAL = 1
+REQUEST_TIMEOUT = 10
+STREAM_TIMEOUT = 90
+
+Command = namedtuple('Command', ['id', 'name', 'issued_at', 'received_at'])
+
+# Variables
+
+handle_seconds = Histogram('remote_command_seconds', 'Time from receiving a remote command to acknowledging it.', ('game', 'command'))
+
+# Classes
+
+class CommandChannel(object):
+
+  def __init__(self, game_id, reference_path, database_url=DATABASE_URL):
+    self.reference_path = reference_path
+    self.database_url = database_url
+    self.queue = Queue()
+    self.when_command = None
+    self.current = {}
+    self.seen = None
+    self.synced = False
+    self.latency = dict((name, handle_seconds.labels(game_id, name)) for name in COMMANDS)
+    self.stats = {
+      'connects': 0,
+      'commands': 0,
+      'errors': 0
+    }
+    self.database = None
+    self.retry = Event()
+    self.running = False
+    self.thread = None
+
+  def start(self):
+    if self.running or self.database_url is None:
+      return
+    self.running = True
+    self.thread = Thread(target=self._run, name='commands')
+    self.thread.daemon = True
+    self.thread.start()
+
+  def poll(self):
+    try:
+      return self.queue.get_nowait()
+    except Empty:
+      return None
+
+  def acknowledge(self, command, status=DONE):
+    elapsed = time.monotonic() - command.received_at
+    self.latency[command.name].observe(elapsed)
+    ack = {
+      'id': command.id,
+      'name': command.name,
+      'status': status,
+      'handled_ms': round(elapsed * 1000, 1)
+    }
+    if self.database_url is not None:
+      future = self._database().submit('PUT', '/' + self.reference_path + '/' + ACK_PATH, ack, True)
+      future.add_done_callback(self._acknowledged)
+    return ack
+
+  def close(self):
+    self.running = False
+    self.retry.set()
+    if self.database is not None and self.database is not db:
+      self.database.pool.close()
+      self.database = None
+
+  def _database(self):
+    if self.database is None:
+      if self.database_url == DATABASE_URL:
+        self.database = db
+      else:
+        self.database = RestDatabase(ConnectionPool(self.database_url, keep_alive_interval=None))
+    return self.database
+
+  def _acknowledged(self, future):
+    if future.exception() is not None:
+      self.stats['errors'] += 1
+
+  def _run(self):
+    while self.running:
+      self.retry.wait(connection.delay())
+      self.retry.clear()
+      try:
+        with database_request(self.database_url, self.reference_path + '/' + COMMAND_PATH, stream=True, timeout=STREAM_TIMEOUT) as response:
+          self.stats['connects'] += 1
+          connection.succeeded()
+          for event, message in read_events(response):
+            if not self.running or event in ('cancel', 'auth_revoked'):
+              break
+            if event in ('put', 'patch'):
+              self._received(event, message)
+      except Exception:
+        if self.running:
+          self.stats['errors'] += 1
+          connection.failed()
+          continue
+      self.retry.wait(RECONNECT_INTERVAL)
+      self.retry.clear()
+
+  def _received(self, event, message):
+    path = message['path'].strip('/')
+    data = message['data']
+    if path == '':
+      if event == 'put':
+        self.current = data if isinstance(data, dict) else {}
+      elif isinstance(data, dict):
+        self.current.update(data)
+    elif '/' not in path:
+      self.current[path] = data
+    command_id = self.current.get('id')
+    if not self.synced:
+      self.synced = True
+      self.seen = command_id
+      return
+    if command_id is None or command_id == self.seen:
+      return
+    self.seen = command_id
+    name = self.current.get('name')
+    if name not in COMMANDS:
+      return
+    command = Command(command_id, name, self.current.get('issued_at'), time.monotonic())
+    self.stats['commands'] += 1
+    self.queue.put(command)
+    if self.when_command is not None:
+      self.when_command(command)
+
+# Functions
+
+def auth_query(database_url):
+  if database_url != DATABASE_URL:
+    return {}
+  return database_auth()
+
+def database_request(database_url, reference_path, method='GET', value=None, stream=False, timeout=REQUEST_TIMEOUT):
+  url = '{}/{}.json'.format(database_url.rstrip('/'), reference_path.strip('/'))
+  query = auth_query(database_url)
+  if len(query) > 0:
+    url += '?' + urlencode(query)
+  headers = {}
+  if stream:
+    headers['Accept'] = 'text/event-stream'
+  data = None
+  if value is not None:
+    data = dumps(value).encode('utf-8')
+    headers['Content-Type'] = 'application/json'
+  return urlopen(Request(url, data, headers, method=method), timeout=timeout)
+
+def read_events(response):
+  event = None
+  data = []
+  for line in response:
+    line = line.decode('utf-8').rstrip('\r\n')
+    if line == '':
+      if event is not None:
+        yield event, loads('\n'.join(data)) if len(data) > 0 else None
+      event = None
+      data = []
+    elif line.startswith('event:'):
+      event = line[6:].strip()
+    elif line.startswith('data:'):
+      data.append(line[5:].strip())
+
+def send_command(reference_path, name, database_url=DATABASE_URL, timeout=REQUEST_TIMEOUT):
+  command_id = uuid4().hex
+  try:
+    with database_request(database_url, reference_path + '/' + ACK_PATH, stream=True, timeout=timeout) as acks:
+      start = time.monotonic()
+      database_request(database_url, reference_path + '/' + COMMAND_PATH, 'PUT', {
+        'id': command_id,
+        'name': name,
+        'issued_at': {'.sv': 'timestamp'}
+      }).close()
+      for event, message in read_events(acks):
+        ack = message['data'] if event == 'put' and message['path'] == '/' else None
+        if isinstance(ack, dict) and ack.get('id') == command_id:
+          return ack, time.monotonic() - start
+  except OSError:
+    pass
+  return None, None
+
+# Main
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='Send a remote command to a game and time its acknowledgement.')
+  parser.add_argument('game_id')
+  parser.add_argument('command', choices=COMMANDS)
+  parser.add_argument('--url', default=DATABASE_URL, help='database URL, for example of fake_rtdb.py')
+  parser.add_argument('--timeout', type=float, default=REQUEST_TIMEOUT)
+  args = parser.parse_args()
+  ack, elapsed = send_command('games/' + args.game_id, args.command, args.url, args.timeout)
+  if ack is None:
+    print('No acknowledgement within {} seconds'.format(args.timeout))
+  else:
+    print('{} {}: round trip {:.0f} ms, handled after {} ms'.format(ack['name'], ack['status'], elapsed * 1000, ack['handled_ms']))
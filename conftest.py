@@ -0,0 +1,48 @@
+from fake_arduino import FakeArduino
+from fake_rtdb import FakeRealtimeDatabase
+from serial_reader import LineDecoder, SerialReader
+import pytest
+import time
+
+# Constants
+
+BAUD = 57600
+TIMEOUT = 5
+
+# Fixtures
+
+@pytest.fixture
+def binary():
+  return False
+
+@pytest.fixture
+def arduino(binary):
+  device = FakeArduino(binary=binary)
+  yield device
+  device.close()
+
+@pytest.fixture
+def decoder():
+  return LineDecoder(lambda line: int(line))
+
+@pytest.fixture
+def reader(arduino, decoder):
+  serial_reader = SerialReader(arduino.port, BAUD, decoder)
+  serial_reader.start()
+  yield serial_reader
+  serial_reader.close()
+
+@pytest.fixture
+def database():
+  server = FakeRealtimeDatabase()
+  server.start()
+  yield server
+  server.close()
+
+# Functions
+
+def wait_until(predicate, timeout=TIMEOUT):
+  deadline = time.monotonic() + timeout
+  while not predicate():
+    assert time.monotonic() < deadline
+    time.sleep(0.005)
@@ -0,0 +1,74 @@
+from random import uniform
+from threading import Lock
+from time import monotonic
+import firebase
+
+# Constants
+
+BACKOFF_BASE = 1
+BACKOFF_CAP = 60
+
+# Classes
+
+class Connectivity(object):
+
+  def __init__(self, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    self.base = base
+    self.cap = cap
+    self.lock = Lock()
+    self.online = False
+    self.failures = 0
+    self.retry_at = 0
+    self.references = {}
+    self.listeners = []
+
+  def reference(self, path):
+    with self.lock:
+      reference = self.references.get(path)
+      if reference is None:
+        reference = firebase.db.reference(path)
+        self.references[path] = reference
+      return reference
+
+  def subscribe(self, listener):
+    self.listeners.append(listener)
+
+  def ready(self):
+    return monotonic() >= self.retry_at
+
+  def delay(self):
+    return max(self.retry_at - monotonic(), 0)
+
+  def succeeded(self):
+    with self.lock:
+      self.failures = 0
+      self.retry_at = 0
+      changed = not self.online
+      self.online = True
+    if changed:
+      self._notify()
+
+  def failed(self):
+    now = monotonic()
+    with self.lock:
+      if now < self.retry_at:
+        return
+      self.failures += 1
+      self.retry_at = now + backoff(self.failures, self.base, self.cap)
+      changed = self.online
+      self.online = False
+    if changed:
+      self._notify()
+
+  def _notify(self):
+    print('Database connection is {}'.format('online' if self.online else 'offline'))
+    for listener in list(self.listeners):
+      listener(self.online)
+
+# Functions
+
+def backoff(failures, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+  delay = min(cap, base * 2 ** (failures - 1))
+  return delay / 2 + uniform(0, delay / 2)
+
+connection = Connectivity()
@@ -0,0 +1,127 @@
+from argparse import ArgumentParser
+from ast import literal_eval
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from os import cpu_count
+from time import perf_counter
+import numpy as np
+import simulator
+
+# Constants
+
+PLAYER_PARAMETERS = ['reaction_time', 'error_rate']
+DEFAULT_GRIDS = {
+  'simon_says_game': {'START_VELOCITY': [800, 600, 400], 'VELOCITY_STEP': [25, 50, 100]},
+  'follow_the_leader_game': {'MAX_LEVEL': [10, 15, 20]},
+  'push_pull_game': {'MAX_LEVEL': [3, 5, 8]},
+  'under_pressure_game': {'WINDOWS': [
+    {'low': (200, 300), 'medium': (400, 500), 'high': (600, 700)},
+    {'low': (215, 285), 'medium': (415, 485), 'high': (615, 685)},
+    {'low': (230, 270), 'medium': (430, 470), 'high': (630, 670)}
+  ]},
+  'dial_it_in_game': {'MAX_LEVEL': [2, 3, 5]}
+}
+
+# Functions
+
+def parse_grid(specs):
+  grid = {}
+  for spec in specs:
+    name, values = spec.split('=', 1)
+    grid[name] = [literal_eval(v) for v in values.split('|')]
+  return grid
+
+def expand_grid(grid):
+  names = sorted(grid)
+  return [dict(zip(names, values)) for values in product(*[grid[n] for n in names])]
+
+def make_jobs(name, configurations, players, sessions, reaction_time, error_rate, seed):
+  jobs = []
+  for index, configuration in enumerate(configurations):
+    overrides = {k: v for k, v in configuration.items() if k not in PLAYER_PARAMETERS}
+    generator = np.random.default_rng(seed)
+    mean_reaction_time = configuration.get('reaction_time', reaction_time)
+    mean_error_rate = configuration.get('error_rate', error_rate)
+    for player in range(players):
+      player_reaction_time = float(max(0.1, generator.normal(mean_reaction_time, mean_reaction_time / 4)))
+      player_error_rate = float(np.clip(generator.normal(mean_error_rate, mean_error_rate / 2), 0, 1))
+      jobs.append((index, name, overrides, seed + player, player_reaction_time, player_error_rate, sessions))
+  return jobs
+
+def run_job(job):
+  index, name, overrides, seed, reaction_time, error_rate, sessions = job
+  simulation, elapsed = simulator.simulate(name, sessions, seed, reaction_time, error_rate, overrides=overrides)
+  return index, [(r['score'], r['strikes'], r['duration'], r['completed'], r['timed_out']) for r in simulation.results]
+
+def collect(configurations, outcomes):
+  rows = [[] for _ in configurations]
+  for index, results in outcomes:
+    rows[index].extend(results)
+  batches = []
+  for results in rows:
+    data = np.array(results, dtype=float).reshape(-1, 5)
+    batches.append({
+      'score': data[:, 0],
+      'strikes': data[:, 1],
+      'duration': data[:, 2],
+      'completed': data[:, 3].astype(bool),
+      'timed_out': data[:, 4].astype(bool)
+    })
+  return batches
+
+def tune(name, grid, players, sessions, reaction_time, error_rate, seed=0, workers=None):
+  configurations = expand_grid(grid)
+  jobs = make_jobs(name, configurations, players, sessions, reaction_time, error_rate, seed)
+  with ProcessPoolExecutor(workers) as executor:
+    outcomes = list(executor.map(run_job, jobs))
+  return configurations, collect(configurations, outcomes)
+
+def describe(configuration):
+  return ', '.join('{}={}'.format(k, v) for k, v in sorted(configuration.items()))
+
+def print_report(name, configurations, batches):
+  print(name)
+  print('  {:>10} {:>8} {:>8} {:>8} {:>10} {:>10}  {}'.format('Completed', 'Score', 'p10', 'Strikes', 'Length', 'p90', 'Configuration'))
+  for configuration, batch in zip(configurations, batches):
+    if len(batch['score']) == 0:
+      continue
+    print('  {:>9.0f}% {:>8.1f} {:>8.1f} {:>8.2f} {:>9.0f}s {:>9.0f}s  {}'.format(
+      batch['completed'].mean() * 100, batch['score'].mean(), np.percentile(batch['score'], 10),
+      batch['strikes'].mean(), np.median(batch['duration']), np.percentile(batch['duration'], 90),
+      describe(configuration)))
+
+def save(output_path, results):
+  arrays = {}
+  for name, (configurations, batches) in results.items():
+    for i, (configuration, batch) in enumerate(zip(configurations, batches)):
+      for key, values in batch.items():
+        arrays['{}/{}/{}'.format(name, i, key)] = values
+      arrays['{}/{}/configuration'.format(name, i)] = np.array(describe(configuration))
+  np.savez_compressed(output_path, **arrays)
+
+# Main
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='Sweep game constants against simulated players and report completion rates and session lengths.')
+  parser.add_argument('games', nargs='*', default=simulator.GAMES)
+  parser.add_argument('--grid', action='append', default=[], metavar='NAME=V1|V2', help='values to sweep for a game constant, reaction_time or error_rate')
+  parser.add_argument('--players', type=int, default=20, help='simulated players per configuration')
+  parser.add_argument('--sessions', type=int, default=1, help='sessions per player')
+  parser.add_argument('--reaction-time', type=float, default=0.6)
+  parser.add_argument('--error-rate', type=float, default=0.05)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--workers', type=int, default=cpu_count())
+  parser.add_argument('--output', help='save the score, strike and length arrays as a .npz file')
+  args = parser.parse_args()
+  results = {}
+  for name in args.games:
+    grid = parse_grid(args.grid) if len(args.grid) > 0 else DEFAULT_GRIDS[name]
+    start = perf_counter()
+    configurations, batches = tune(name, grid, args.players, args.sessions, args.reaction_time, args.error_rate, args.seed, args.workers)
+    results[name] = (configurations, batches)
+    print_report(name, configurations, batches)
+    sessions = sum(len(b['score']) for b in batches)
+    simulated = sum(b['duration'].sum() for b in batches)
+    print('  {} sessions, {:.1f} simulated hours in {:.1f}s'.format(sessions, simulated / 3600, perf_counter() - start))
+  if args.output:
+    save(args.output, results)
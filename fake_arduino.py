@@ -0,0 +1,51 @@
+from serial_protocol import encode_frame
+from threading import Event, Thread
+import os
+import tty
+
+# Classes
+
+class FakeArduino(object):
+
+  def __init__(self, binary=False):
+    self.master, self.slave = os.openpty()
+    tty.setraw(self.slave)
+    self.port = os.ttyname(self.slave)
+    self.binary = binary
+    self.sequence = 0
+    self.stopped = Event()
+    self.thread = None
+
+  def write(self, data):
+    os.write(self.master, data)
+
+  def send(self, value):
+    if self.binary:
+      self.write(encode_frame(self.sequence, value))
+      self.sequence = (self.sequence + 1) & 0xFF
+    else:
+      self.write('{}\r\n'.format(value).encode('utf-8'))
+
+  def play(self, values, interval):
+    self.stop()
+    self.stopped.clear()
+    self.thread = Thread(target=self._play, args=(values, interval))
+    self.thread.daemon = True
+    self.thread.start()
+
+  def stop(self):
+    if self.thread is not None:
+      self.stopped.set()
+      self.thread.join()
+      self.thread = None
+
+  def close(self):
+    self.stop()
+    os.close(self.master)
+    os.close(self.slave)
+
+  def _play(self, values, interval):
+    for value in values:
+      if self.stopped.wait(interval):
+        return
+      self.send(value)
@@ -0,0 +1,225 @@
+from argparse import ArgumentParser
+from command_channel import CommandChannel, send_command
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps, loads
+from queue import Empty, Queue
+from threading import Lock, Thread
+from uuid import uuid4
+import time
+
+# Constants
+
+KEEP_ALIVE_INTERVAL = 30
+POLL_INTERVAL = 0.01
+
+# Classes
+
+class FakeDatabase(object):
+
+  def __init__(self):
+    self.data = {}
+    self.lock = Lock()
+    self.listeners = []
+
+  def get(self, path):
+    with self.lock:
+      return self._get(split(path))
+
+  def put(self, path, value):
+    keys = split(path)
+    with self.lock:
+      value = resolve(value)
+      if len(keys) == 0:
+        self.data = value if isinstance(value, dict) else {}
+      else:
+        parent = self.data
+        for key in keys[:-1]:
+          if not isinstance(parent.get(key), dict):
+            parent[key] = {}
+          parent = parent[key]
+        if value is None:
+          parent.pop(keys[-1], None)
+        else:
+          parent[keys[-1]] = value
+      self._notify(keys, value)
+    return value
+
+  def patch(self, path, values):
+    for key, value in values.items():
+      self.put(path + '/' + key, value)
+    return values
+
+  def listen(self, path):
+    events = Queue()
+    with self.lock:
+      listener = (split(path), events)
+      self.listeners.append(listener)
+      events.put(('put', {'path': '/', 'data': self._get(listener[0])}))
+    return listener
+
+  def unlisten(self, listener):
+    with self.lock:
+      self.listeners.remove(listener)
+
+  def _get(self, keys):
+    node = self.data
+    for key in keys:
+      if not isinstance(node, dict) or key not in node:
+        return None
+      node = node[key]
+    return node
+
+  def _notify(self, keys, value):
+    for listener_keys, events in self.listeners:
+      if keys[:len(listener_keys)] == listener_keys:
+        events.put(('put', {'path': '/' + '/'.join(keys[len(listener_keys):]), 'data': value}))
+      elif listener_keys[:len(keys)] == keys:
+        events.put(('put', {'path': '/', 'data': self._get(listener_keys)}))
+
+class FakeDatabaseHandler(BaseHTTPRequestHandler):
+
+  protocol_version = 'HTTP/1.1'
+
+  def do_GET(self):
+    if 'text/event-stream' in self.headers.get('Accept', ''):
+      self._stream()
+    else:
+      self._reply(self.server.database.get(self._path()))
+
+  def do_PUT(self):
+    self._reply(self.server.database.put(self._path(), self._body()))
+
+  def do_POST(self):
+    name = '-{:013d}{}'.format(int(time.time() * 1000), uuid4().hex[:7])
+    self.server.database.put(self._path() + '/' + name, self._body())
+    self._reply({'name': name})
+
+  def do_PATCH(self):
+    self._reply(self.server.database.patch(self._path(), self._body()))
+
+  def do_DELETE(self):
+    self._reply(self.server.database.put(self._path(), None))
+
+  def log_message(self, format, *args):
+    pass
+
+  def _path(self):
+    path = self.path.split('?')[0]
+    if path.endswith('.json'):
+      path = path[:-5]
+    return path
+
+  def _body(self):
+    return loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+
+  def _reply(self, value):
+    body = dumps(value).encode('utf-8')
+    self.send_response(200)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def _stream(self):
+    database = self.server.database
+    listener = database.listen(self._path())
+    self.close_connection = True
+    self.send_response(200)
+    self.send_header('Content-Type', 'text/event-stream')
+    self.send_header('Cache-Control', 'no-cache')
+    self.end_headers()
+    try:
+      while self.server.running:
+        try:
+          event, data = listener[1].get(timeout=KEEP_ALIVE_INTERVAL)
+        except Empty:
+          event, data = 'keep-alive', None
+        self.wfile.write('event: {}\ndata: {}\n\n'.format(event, dumps(data)).encode('utf-8'))
+        self.wfile.flush()
+    except OSError:
+      pass
+    finally:
+      database.unlisten(listener)
+
+class FakeRealtimeDatabase(object):
+
+  def __init__(self, port=0, host='127.0.0.1'):
+    self.server = ThreadingHTTPServer((host, port), FakeDatabaseHandler)
+    self.server.daemon_threads = True
+    self.server.database = FakeDatabase()
+    self.server.running = True
+    self.database = self.server.database
+    self.url = 'http://{}:{}'.format(host, self.server.server_address[1])
+    self.thread = None
+
+  def start(self):
+    self.thread = Thread(target=self.server.serve_forever, name='fake-rtdb')
+    self.thread.daemon = True
+    self.thread.start()
+
+  def close(self):
+    self.server.running = False
+    self.server.shutdown()
+    self.server.server_close()
+
+# Functions
+
+def split(path):
+  return [k for k in path.split('/') if k != '']
+
+def resolve(value):
+  if isinstance(value, dict):
+    if value == {'.sv': 'timestamp'}:
+      return int(time.time() * 1000)
+    return dict((k, resolve(v)) for k, v in value.items())
+  return value
+
+def benchmark(commands=50, game_id='proto-box-benchmark'):
+  database = FakeRealtimeDatabase()
+  database.start()
+  reference_path = 'games/' + game_id
+  channel = CommandChannel(game_id, reference_path, database.url)
+  channel.start()
+  while channel.stats['connects'] == 0:
+    time.sleep(POLL_INTERVAL)
+  handling = True
+  def handle():
+    while handling:
+      command = channel.poll()
+      if command is None:
+        time.sleep(POLL_INTERVAL)
+      else:
+        channel.acknowledge(command)
+  handler = Thread(target=handle)
+  handler.start()
+  round_trips = []
+  for i in range(commands):
+    ack, elapsed = send_command(reference_path, ['start', 'stop', 'reset'][i % 3], database.url)
+    if ack is not None:
+      round_trips.append(elapsed)
+  handling = False
+  handler.join()
+  channel.close()
+  database.close()
+  return round_trips
+
+# Main
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='Serve a local stand-in for the firebase realtime database REST and streaming API.')
+  parser.add_argument('--port', type=int, default=9200)
+  parser.add_argument('--benchmark', type=int, metavar='COMMANDS', help='time remote commands against a stand-in instead of serving')
+  args = parser.parse_args()
+  if args.benchmark:
+    round_trips = sorted(benchmark(args.benchmark))
+    print('Acknowledged {} of {} commands'.format(len(round_trips), args.benchmark))
+    if len(round_trips) > 0:
+      print('Round trip p50 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms'.format(
+        round_trips[len(round_trips) // 2] * 1000, round_trips[int(len(round_trips) * 0.99)] * 1000, round_trips[-1] * 1000))
+  else:
+    database = FakeRealtimeDatabase(args.port, '0.0.0.0')
+    print('Serving a fake realtime database on port {}'.format(args.port))
+    try:
+      database.server.serve_forever()
+    except KeyboardInterrupt:
+      database.close()
@@ -1,13 +1,13 @@
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import db
-from firebase_admin import firestore
+from http_pool import ConnectionPool
+from json import dumps, loads
+from metrics import Counter, Histogram
 from os import path
-from time import sleep
+from threading import Lock
+from urllib.parse import quote, urlencode
 
 # Constants
 
-CRED = credentials.Certificate(path.dirname(path.abspath(__file__)) + '/configs/aptitude-cloud-firebase-adminsdk-pv06k-64624c438a.json')
+CRED_PATH = path.dirname(path.abspath(__file__)) + '/configs/aptitude-cloud-firebase-adminsdk-pv06k-64624c438a.json'
 OPTS = {
   'databaseURL': 'https://aptitude-cloud.firebaseio.com',
   'databaseAuthVariableOverride': {
@@ -15,8 +15,164 @@ OPTS = {
   },
   'projectId': 'aptitude-cloud'
 }
+TIMED_METHODS = ['add', 'commit', 'delete', 'get', 'push', 'set', 'update']
+CHAINED_METHODS = {
+  'batch': ['commit'],
+  'child': TIMED_METHODS,
+  'collection': TIMED_METHODS,
+  'reference': TIMED_METHODS
+}
+
+# Variables
+
+app = None
+pool = None
+app_lock = Lock()
+token_lock = Lock()
+request_seconds = Histogram('firebase_request_seconds', 'Latency of firebase database and firestore calls.', ('service', 'method'))
+request_errors = Counter('firebase_errors_total', 'Firebase database and firestore calls that raised an error.', ('service', 'method'))
+
+# Classes
+
+class LazyService(object):
+
+  def __init__(self, loader):
+    self._loader = loader
+    self._service = None
+    self._lock = Lock()
+
+  def __getattr__(self, name):
+    if self._service is None:
+      with self._lock:
+        if self._service is None:
+          initialize()
+          self._service = self._loader()
+    return getattr(self._service, name)
+
+class TimedService(object):
+
+  def __init__(self, target, service, methods=TIMED_METHODS):
+    self._target = target
+    self._service = service
+    self._methods = methods
+
+  def __getattr__(self, name):
+    value = getattr(self._target, name)
+    if name in self._methods:
+      return timed_call(value, request_seconds.labels(self._service, name), request_errors.labels(self._service, name))
+    if name in CHAINED_METHODS:
+      return lambda *args, **kwargs: TimedService(value(*args, **kwargs), self._service, CHAINED_METHODS[name])
+    return value
+
+class DatabaseError(Exception):
+
+  def __init__(self, status, body):
+    super().__init__('Database request failed with status {}: {}'.format(status, body[:200]))
+    self.status = status
+
+class RestReference(object):
+
+  def __init__(self, database, path):
+    self.database = database
+    self.path = '/' + path.strip('/')
+
+  def child(self, name):
+    return RestReference(self.database, self.path.rstrip('/') + '/' + name)
+
+  def get(self):
+    return self.database.request('GET', self.path)
+
+  def set(self, value):
+    self.database.request('PUT', self.path, value, True)
+
+  def update(self, values):
+    self.database.request('PATCH', self.path, values, True)
+
+  def push(self, value):
+    return self.child(self.database.request('POST', self.path, value)['name'])
+
+  def delete(self):
+    self.database.request('DELETE', self.path, None, True)
+
+class RestDatabase(object):
+
+  def __init__(self, pool, auth=None):
+    self.pool = pool
+    self.auth = auth
+
+  def reference(self, path='/'):
+    return RestReference(self, path)
+
+  def request(self, method, path, value=None, silent=False):
+    query = {} if self.auth is None else self.auth()
+    if silent:
+      query['print'] = 'silent'
+    body = None if value is None else dumps(value).encode('utf-8')
+    response = self.pool.request(method, quote(path.rstrip('/') or '/') + '.json?' + urlencode(query), body, {'Content-Type': 'application/json'})
+    if response.status >= 400:
+      raise DatabaseError(response.status, response.body.decode('utf-8', 'replace'))
+    if len(response.body) == 0:
+      return None
+    return loads(response.body)
+
+  def submit(self, method, path, value=None, silent=False):
+    return self.pool.execute(self.request, method, path, value, silent)
+
+# Functions
+
+def initialize():
+  global app
+  if app is None:
+    with app_lock:
+      if app is None:
+        import firebase_admin
+        from firebase_admin import credentials
+        app = firebase_admin.initialize_app(credential=credentials.Certificate(CRED_PATH), options=OPTS)
+  return app
+
+def database_auth():
+  credential = initialize().credential.get_credential()
+  if not credential.valid:
+    with token_lock:
+      if not credential.valid:
+        from google.auth.transport.requests import Request
+        credential.refresh(Request())
+  return {
+    'access_token': credential.token,
+    'auth_variable_override': dumps(OPTS['databaseAuthVariableOverride'])
+  }
+
+def load_db():
+  global pool
+  pool = ConnectionPool(OPTS['databaseURL'], auth=database_auth)
+  return TimedService(RestDatabase(pool, database_auth), 'db')
+
+def start_keep_alive():
+  if pool is not None:
+    pool.start()
+
+def stop_keep_alive():
+  if pool is not None:
+    pool.stop()
+
+def load_store():
+  from firebase_admin import firestore
+  return TimedService(firestore.client(), 'firestore')
+
+def timed_call(function, latency, errors):
+  def call(*args, **kwargs):
+    with latency.time():
+      try:
+        return function(*args, **kwargs)
+      except Exception:
+        errors.inc()
+        raise
+  return call
+
+db = LazyService(load_db)
+store = LazyService(load_store)
 
 # Main
 
-firebase_admin.initialize_app(credential=CRED, options=OPTS)
-store = firestore.client()
\ No newline at end of file
+if __name__ == '__main__':
+  store.collection('results')
@@ -0,0 +1,228 @@
+from animation import blink, play, stop
+from audio_scheduler import BACKGROUND, CUE, DIALOG, RESULT, SFX, play_sound, setup_channels, skip, wait_for_completion
+from clock import monotonic, sleep
+from command_channel import CommandChannel, IGNORED
+from connectivity import connection
+from firebase import start_keep_alive, stop_keep_alive, store
+from gpiozero import Button, LED
+from input_engine import InputEngine
+from leaderboard import Leaderboard
+from metrics import LOOP_SECONDS, start_server
+from pygame import mixer
+from result_journal import ResultJournal
+from session import Session
+from sound_bank import clear_sounds, get_sound, load_sounds
+from telemetry import TelemetryWriter
+
+# Constants
+
+GAME_DB = 'games'
+POLL_INTERVAL = 0.01
+START_BLINK = 0.5
+START_DIALOG_INTERVAL = 30
+
+# Classes
+
+class GameState(object):
+
+  __slots__ = ['level', 'score', 'strikes']
+
+  def __init__(self):
+    self.level = 1
+    self.score = 0
+    self.strikes = 0
+
+class GameEngine(object):
+
+  def __init__(self, game_id, name, max_score, max_strikes, sounds_path, start_led, start_button, metrics_port=None):
+    self.game_id = game_id
+    self.name = name
+    self.max_score = max_score
+    self.max_strikes = max_strikes
+    self.sounds_path = sounds_path
+    self.metrics_port = metrics_port
+    self.state = self.new_state()
+    self.start_led = LED(start_led)
+    self.start_button = Button(start_button)
+    self.start_blink = blink([self.start_led], START_BLINK, START_BLINK)
+    self.inputs = InputEngine()
+    self.commands = CommandChannel(game_id, GAME_DB + '/' + game_id)
+    self.commands.when_command = self.wake
+    self.stop_command = None
+    self.telemetry = TelemetryWriter(GAME_DB + '/' + game_id)
+    self.journal = ResultJournal(store)
+    self.leaderboard = Leaderboard()
+    self.session = Session(game_id, max_score, max_strikes)
+    self.loop_seconds = LOOP_SECONDS.labels(game_id)
+
+  def new_state(self):
+    return GameState()
+
+  def reset(self):
+    pass
+
+  def begin(self, instructions):
+    wait_for_completion(instructions, self.start_button)
+
+  def playing(self):
+    raise NotImplementedError
+
+  def loop(self):
+    raise NotImplementedError
+
+  def finish(self):
+    state = self.state
+    state.score -= state.strikes
+    return state.strikes < self.max_strikes
+
+  def close(self):
+    self.start_led.close()
+    self.start_button.close()
+
+  def wake(self, command):
+    if command.name != 'start':
+      self.inputs.push(self.start_button, True)
+
+  def interrupted(self):
+    command = self.commands.poll() if self.stop_command is None else None
+    if command is not None:
+      if command.name == 'start':
+        self.commands.acknowledge(command, IGNORED)
+      else:
+        self.stop_command = command
+    return self.stop_command is not None or self.start_button.is_pressed
+
+  def play(self, sound, kind=SFX, priority=BACKGROUND):
+    return play_sound(get_sound(self.sounds_path + '/' + sound), kind, priority)
+
+  def is_online(self):
+    return connection.online
+
+  def report_progress(self):
+    self.telemetry.update({
+      'score': self.state.score,
+      'strikes': self.state.strikes
+    })
+
+  def init(self):
+    self.start_led.on()
+    start_server(self.metrics_port)
+    mixer.init()
+    setup_channels()
+    load_sounds(self.sounds_path)
+    self.telemetry.update({
+      'name': self.name,
+      'alive': True,
+      'status': 'Initializing',
+      'score': 0,
+      'max_score': self.max_score,
+      'strikes': 0,
+      'max_strikes': self.max_strikes,
+      'started_at': 0,
+      'completed_at': 0
+    })
+    self.telemetry.start()
+    self.journal.start()
+    self.commands.start()
+
+  def wait_for_start(self):
+    start_keep_alive()
+    play(self.start_blink)
+    next_dialog = monotonic()
+    while not self.start_button.is_pressed:
+      command = self.commands.poll()
+      if command is not None:
+        if command.name == 'start':
+          self.commands.acknowledge(command)
+          break
+        self.commands.acknowledge(command, IGNORED)
+      now = monotonic()
+      if now >= next_dialog:
+        self.play('dialog/start.wav', DIALOG)
+        next_dialog = now + START_DIALOG_INTERVAL
+      sleep(POLL_INTERVAL)
+    stop([self.start_led])
+    self.start_led.off()
+    stop_keep_alive()
+
+  def start(self):
+    self.state = self.new_state()
+    self.reset()
+    self.telemetry.update({
+      'status': 'Ready',
+      'score': 0,
+      'strikes': 0,
+      'started_at': 0,
+      'completed_at': 0
+    })
+    self.wait_for_start()
+    instructions = self.play('dialog/instructions.wav', DIALOG, CUE)
+    self.telemetry.update({
+      'status': 'Playing',
+      'started_at': self.session.start()
+    })
+    self.begin(instructions)
+
+  def complete(self):
+    succeeded = self.finish()
+    state = self.state
+    if succeeded:
+      result = self.play('dialog/on_success.wav', DIALOG, RESULT)
+    else:
+      result = self.play('dialog/on_failure.wav', DIALOG, RESULT)
+    print('Result: [ Score: {}, Strikes {} ]'.format(state.score, state.strikes))
+    self.telemetry.update({
+      'status': 'Finished',
+      'score': state.score,
+      'strikes': state.strikes,
+      'completed_at': self.session.complete(state.score, state.strikes)
+    })
+    record = self.session.to_result()
+    self.leaderboard.record(record, self.journal.append(record))
+    wait_for_completion(result)
+
+  def clean_up(self):
+    self.telemetry.update({
+      'alive': False,
+      'status': 'Inactive',
+      'started_at': 0,
+      'completed_at': 0
+    })
+    self.telemetry.close()
+    self.journal.close()
+    self.leaderboard.close()
+    self.commands.close()
+    self.close()
+    skip()
+    clear_sounds()
+    mixer.quit()
+
+  def run(self):
+    try:
+      print('Initializing ...')
+      self.init()
+      print('{} is now active!'.format(self.name))
+      while True:
+        print('Press the start button to play ...')
+        self.start()
+        while self.playing():
+          print('Score: {}, Strikes: {}'.format(self.state.score, self.state.strikes))
+          with self.loop_seconds.time():
+            self.loop()
+          if self.interrupted():
+            break
+        command, self.stop_command = self.stop_command, None
+        if command is not None:
+          self.commands.acknowledge(command)
+          if command.name == 'reset':
+            print('{} reset!'.format(self.name))
+            self.finish()
+            continue
+        print('{} completed!'.format(self.name))
+        self.complete()
+    except KeyboardInterrupt:
+      print('Keyboard interrupt detected! Closing ...')
+    except Exception:
+      print('Error detected! Closing ...')
+    finally:
+      self.clean_up()
@@ -0,0 +1,293 @@
+from argparse import ArgumentParser
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from metrics import Counter
+from queue import Empty, LifoQueue
+from threading import BoundedSemaphore, Event, Thread
+from urllib.parse import urlencode, urlsplit
+import time
+
+# Constants
+
+POOL_SIZE = 4
+KEEP_ALIVE_INTERVAL = 30
+REQUEST_TIMEOUT = 10
+PING_PATH = '/.json?shallow=true'
+RETRIED_METHODS = ['DELETE', 'GET', 'PATCH', 'PUT']
+
+Response = namedtuple('Response', ['status', 'body'])
+
+# Variables
+
+opened_connections = Counter('http_connections_opened_total', 'Connections (and TLS handshakes) opened by the HTTP pools.', ('host',))
+
+# Classes
+
+class PooledConnection(object):
+
+  def __init__(self, connection):
+    self.connection = connection
+    self.last_used = time.monotonic()
+
+class ConnectionPool(object):
+
+  def __init__(self, url, size=POOL_SIZE, keep_alive_interval=KEEP_ALIVE_INTERVAL, timeout=REQUEST_TIMEOUT, context=None, ping_path=PING_PATH, auth=None):
+    parts = urlsplit(url)
+    self.secure = parts.scheme == 'https'
+    self.host = parts.hostname
+    self.port = parts.port
+    self.size = size
+    self.keep_alive_interval = keep_alive_interval
+    self.timeout = timeout
+    self.context = context
+    self.ping_path = ping_path
+    self.auth = auth
+    self.idle = LifoQueue()
+    self.slots = BoundedSemaphore(size)
+    self.executor = None
+    self.opened = opened_connections.labels(self.host)
+    self.stats = {
+      'connects': 0,
+      'reused': 0,
+      'requests': 0,
+      'pings': 0,
+      'errors': 0
+    }
+    self.keep_alive = None
+
+  def start(self):
+    if self.keep_alive is not None or self.keep_alive_interval is None:
+      return
+    self.keep_alive = Event()
+    thread = Thread(target=self._run, args=(self.keep_alive,), name='http-keep-alive')
+    thread.daemon = True
+    thread.start()
+
+  def stop(self):
+    if self.keep_alive is not None:
+      self.keep_alive.set()
+      self.keep_alive = None
+
+  def request(self, method, path, body=None, headers=None):
+    with self.slots:
+      while True:
+        pooled, reused = self._acquire()
+        try:
+          response = self._send(pooled, method, path, body, headers)
+        except (HTTPException, OSError):
+          pooled.connection.close()
+          if reused and method in RETRIED_METHODS:
+            continue
+          self.stats['errors'] += 1
+          raise
+        self.stats['requests'] += 1
+        return response
+
+  def submit(self, method, path, body=None, headers=None):
+    return self.execute(self.request, method, path, body, headers)
+
+  def execute(self, function, *args):
+    if self.executor is None:
+      self.executor = ThreadPoolExecutor(self.size, 'http-pool')
+    return self.executor.submit(function, *args)
+
+  def close(self):
+    self.stop()
+    if self.executor is not None:
+      self.executor.shutdown()
+    while True:
+      try:
+        self.idle.get_nowait().connection.close()
+      except Empty:
+        return
+
+  def _connect(self):
+    if self.secure:
+      connection = HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.context)
+    else:
+      connection = HTTPConnection(self.host, self.port, timeout=self.timeout)
+    connection.connect()
+    self.stats['connects'] += 1
+    self.opened.inc()
+    return PooledConnection(connection)
+
+  def _acquire(self):
+    try:
+      pooled = self.idle.get_nowait()
+    except Empty:
+      return self._connect(), False
+    self.stats['reused'] += 1
+    return pooled, True
+
+  def _send(self, pooled, method, path, body, headers):
+    pooled.connection.request(method, path, body, headers or {})
+    response = pooled.connection.getresponse()
+    data = response.read()
+    if response.will_close:
+      pooled.connection.close()
+    else:
+      pooled.last_used = time.monotonic()
+      self.idle.put(pooled)
+    return Response(response.status, data)
+
+  def _ping_path(self):
+    if self.auth is None:
+      return self.ping_path
+    return self.ping_path + ('&' if '?' in self.ping_path else '?') + urlencode(self.auth())
+
+  def _ping(self, pooled, path):
+    try:
+      response = self._send(pooled, 'GET', path, None, None)
+    except (HTTPException, OSError):
+      pooled.connection.close()
+      try:
+        response = self._send(self._connect(), 'GET', path, None, None)
+      except (HTTPException, OSError):
+        self.stats['errors'] += 1
+        return
+    if response.status >= 300:
+      self.stats['errors'] += 1
+      return
+    self.stats['pings'] += 1
+
+  def _run(self, stopped):
+    while not stopped.wait(self.keep_alive_interval / 2):
+      stale = []
+      fresh = []
+      while True:
+        try:
+          pooled = self.idle.get_nowait()
+        except Empty:
+          break
+        if time.monotonic() - pooled.last_used >= self.keep_alive_interval:
+          stale.append(pooled)
+        else:
+          fresh.append(pooled)
+      for pooled in reversed(fresh):
+        self.idle.put(pooled)
+      if len(stale) == 0:
+        continue
+      try:
+        path = self._ping_path()
+      except Exception:
+        self.stats['errors'] += 1
+        for pooled in stale:
+          self.idle.put(pooled)
+        continue
+      for pooled in stale:
+        self._ping(pooled, path)
+
+# Functions
+
+def create_certificate(directory):
+  from subprocess import DEVNULL, run
+  certificate = directory + '/localhost.pem'
+  key = directory + '/localhost.key'
+  run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-subj', '/CN=localhost', '-days', '1',
+    '-keyout', key, '-out', certificate], check=True, stdout=DEVNULL, stderr=DEVNULL)
+  return certificate, key
+
+def start_mock_server(certificate, key, rtt, idle_timeout):
+  from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+  import ssl
+
+  class MockHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    timeout = idle_timeout
+    disable_nagle_algorithm = True
+
+    def setup(self):
+      time.sleep(rtt * 2)
+      super().setup()
+
+    def do_GET(self):
+      self._reply(b'null')
+
+    def do_PATCH(self):
+      self._reply(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+    do_PUT = do_PATCH
+
+    def log_message(self, format, *args):
+      pass
+
+    def _reply(self, body):
+      time.sleep(rtt)
+      self.send_response(200)
+      self.send_header('Content-Type', 'application/json')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+  context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+  context.load_cert_chain(certificate, key)
+  server = ThreadingHTTPServer(('127.0.0.1', 0), MockHandler)
+  server.daemon_threads = True
+  server.socket = context.wrap_socket(server.socket, server_side=True)
+  thread = Thread(target=server.serve_forever)
+  thread.daemon = True
+  thread.start()
+  return server, 'https://localhost:{}'.format(server.server_address[1])
+
+def percentile(values, fraction):
+  values = sorted(values)
+  return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def timed_calls(call, calls, gap=0):
+  latencies = []
+  start = time.monotonic()
+  for _ in range(calls):
+    if gap > 0:
+      time.sleep(gap)
+    began = time.monotonic()
+    call()
+    latencies.append(time.monotonic() - began)
+  return latencies, calls / (time.monotonic() - start - gap * calls)
+
+def benchmark(calls=50, rtt=0.02, idle_timeout=2, gap=3, bursts=4):
+  from tempfile import TemporaryDirectory
+  import ssl
+  results = {}
+  with TemporaryDirectory() as directory:
+    certificate, key = create_certificate(directory)
+    server, url = start_mock_server(certificate, key, rtt, idle_timeout)
+    context = ssl.create_default_context(cafile=certificate)
+    body = b'{"status": "Playing"}'
+    def unpooled():
+      connection = HTTPSConnection('localhost', server.server_address[1], timeout=REQUEST_TIMEOUT, context=context)
+      connection.request('PATCH', '/games/benchmark.json', body)
+      connection.getresponse().read()
+      connection.close()
+    results['new connection per call'] = timed_calls(unpooled, calls)
+    pool = ConnectionPool(url, context=context, keep_alive_interval=None)
+    results['pooled'] = timed_calls(lambda: pool.request('PATCH', '/games/benchmark.json', body), calls)
+    results['pooled, idle between calls'] = timed_calls(lambda: pool.request('PATCH', '/games/benchmark.json', body), bursts, gap)
+    pool.close()
+    pool = ConnectionPool(url, context=context, keep_alive_interval=idle_timeout / 2)
+    pool.start()
+    pool.request('GET', PING_PATH)
+    results['pooled with keep-alive, idle between calls'] = timed_calls(lambda: pool.request('PATCH', '/games/benchmark.json', body), bursts, gap)
+    def concurrent():
+      for future in [pool.submit('PATCH', '/games/benchmark/{}.json'.format(i), body) for i in range(pool.size)]:
+        future.result()
+    latencies, throughput = timed_calls(concurrent, calls // pool.size)
+    results['pooled, {} concurrent writes'.format(pool.size)] = ([l / pool.size for l in latencies], throughput * pool.size)
+    pool.close()
+    server.shutdown()
+    server.server_close()
+  return results
+
+# Main
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='Compare firebase style HTTPS calls with and without a keep-alive connection pool against a local mock server.')
+  parser.add_argument('--calls', type=int, default=50)
+  parser.add_argument('--rtt', type=float, default=0.02, help='simulated network round trip in seconds')
+  parser.add_argument('--idle-timeout', type=float, default=2, help='seconds after which the mock server closes idle connections')
+  args = parser.parse_args()
+  print('{:<44} {:>8} {:>10} {:>10} {:>12}'.format('Transport', 'Calls', 'p50', 'p99', 'Throughput'))
+  for name, (latencies, throughput) in benchmark(args.calls, args.rtt, args.idle_timeout, args.idle_timeout * 1.5).items():
+    print('{:<44} {:>8} {:>8.1f}ms {:>8.1f}ms {:>10.1f}/s'.format(
+      name, len(latencies), percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000, throughput))
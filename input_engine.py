@@ -0,0 +1,77 @@
+from clock import monotonic, wait
+from collections import namedtuple
+from queue import Empty, Full, Queue
+from threading import Event
+
+# Constants
+
+MAX_EVENTS = 256
+
+InputEvent = namedtuple('InputEvent', ['timestamp', 'device', 'pressed'])
+
+# Classes
+
+class InputEngine(object):
+
+  def __init__(self, max_events=MAX_EVENTS):
+    self.events = Queue(max_events)
+    self.available = Event()
+    self.devices = []
+    self.dropped = 0
+
+  def watch(self, devices):
+    for d in devices:
+      d.when_pressed = self._pressed
+      d.when_released = self._released
+      self.devices.append(d)
+
+  def unwatch(self):
+    for d in self.devices:
+      d.when_pressed = None
+      d.when_released = None
+    self.devices = []
+
+  def get_event(self, timeout=None):
+    deadline = None if timeout is None else monotonic() + timeout
+    while True:
+      try:
+        return self.events.get_nowait()
+      except Empty:
+        self.available.clear()
+      if not self.events.empty():
+        continue
+      remaining = None if deadline is None else deadline - monotonic()
+      if remaining is not None and remaining <= 0:
+        return None
+      wait(self.available, remaining)
+
+  def get_events(self):
+    events = []
+    while True:
+      try:
+        events.append(self.events.get_nowait())
+      except Empty:
+        return events
+
+  def wait_for_events(self, timeout=None):
+    event = self.get_event(timeout)
+    if event is None:
+      return []
+    return [event] + self.get_events()
+
+  def clear(self):
+    self.get_events()
+
+  def _pressed(self, device):
+    self.push(device, True)
+
+  def _released(self, device):
+    self.push(device, False)
+
+  def push(self, device, pressed):
+    try:
+      self.events.put_nowait(InputEvent(monotonic(), device, pressed))
+    except Full:
+      self.dropped += 1
+      return
+    self.available.set()
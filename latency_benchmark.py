@@ -0,0 +1,128 @@
+from argparse import ArgumentParser
+from json import dump, load
+from threading import get_ident
+from time import perf_counter
+import clock
+import numpy as np
+import simulator
+
+# Constants
+
+PERCENTILES = [50, 95, 99]
+EXPIRY = 10
+
+# Classes
+
+class LatencyMonitor(object):
+
+  def __init__(self, expiry=EXPIRY):
+    self.expiry = expiry
+    self.pending = []
+    self.latencies = {}
+    self.missed = {}
+    self.thread = get_ident()
+
+  def interaction(self, kind, leds=(), sounds=()):
+    now = clock.monotonic()
+    started = perf_counter()
+    self._expire(now)
+    if len(leds) > 0:
+      self.pending.append((now, started, kind + '/led', set(leds)))
+    if len(sounds) > 0:
+      self.pending.append((now, started, kind + '/sound', set(sounds)))
+
+  def led(self, number):
+    if get_ident() == self.thread:
+      self._output('/led', number)
+
+  def sound(self, name):
+    self._output('/sound', name)
+
+  def close(self):
+    self._expire(None)
+
+  def _output(self, channel, subject):
+    now = clock.monotonic()
+    finished = perf_counter()
+    self._expire(now)
+    for expected in self.pending:
+      started_at, started, key, subjects = expected
+      if key.endswith(channel) and subject in subjects:
+        self.latencies.setdefault(key, []).append((now - started_at, finished - started))
+        self.pending.remove(expected)
+        return
+
+  def _expire(self, now):
+    for expected in list(self.pending):
+      if now is None or now - expected[0] > self.expiry:
+        self.missed[expected[2]] = self.missed.get(expected[2], 0) + 1
+        self.pending.remove(expected)
+
+# Functions
+
+def measure(name, sessions, seed, reaction_time, error_rate):
+  simulator.monitor = LatencyMonitor()
+  try:
+    simulator.simulate(name, sessions, seed, reaction_time, error_rate)
+    simulator.monitor.close()
+    return summarize(simulator.monitor)
+  finally:
+    simulator.monitor = None
+
+def summarize(monitor):
+  report = {}
+  for key in sorted(set(monitor.latencies) | set(monitor.missed)):
+    latencies = np.array(monitor.latencies.get(key, []), ndmin=2) * 1000
+    entry = {'count': len(monitor.latencies.get(key, [])), 'missed': monitor.missed.get(key, 0)}
+    if entry['count'] > 0:
+      virtual = np.percentile(latencies[:, 0], PERCENTILES)
+      compute = np.percentile(latencies[:, 1], PERCENTILES)
+      for i, p in enumerate(PERCENTILES):
+        entry['p{}'.format(p)] = round(float(virtual[i]), 1)
+        entry['compute_p{}'.format(p)] = round(float(compute[i]), 3)
+      entry['max'] = round(float(latencies[:, 0].max()), 1)
+    report[key] = entry
+  return report
+
+def print_report(games, baseline=None):
+  print('{:<24} {:<24} {:>6} {:>6} {:>9} {:>9} {:>9} {:>12}'.format('Game', 'Interaction', 'Count', 'Missed', 'p50', 'p95', 'p99', 'Compute p95'))
+  for name, report in games.items():
+    for key, entry in report.items():
+      columns = []
+      for field, unit in [('p50', 'ms'), ('p95', 'ms'), ('p99', 'ms'), ('compute_p95', 'ms')]:
+        value = entry.get(field)
+        if value is None:
+          columns.append('-')
+          continue
+        before = None
+        if baseline is not None:
+          before = baseline.get(name, {}).get(key, {}).get(field)
+        if before is None:
+          columns.append('{:.2f}{}'.format(value, unit) if field.startswith('compute') else '{:.0f}{}'.format(value, unit))
+        else:
+          columns.append('{:+.2f}{}'.format(value - before, unit) if field.startswith('compute') else '{:+.0f}{}'.format(value - before, unit))
+      print('{:<24} {:<24} {:>6} {:>6} {:>9} {:>9} {:>9} {:>12}'.format(name, key, entry['count'], entry['missed'], *columns))
+
+# Main
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='Measure the time from a simulated player input to the LED or sound that answers it.')
+  parser.add_argument('games', nargs='*', default=simulator.GAMES)
+  parser.add_argument('--sessions', type=int, default=20)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--reaction-time', type=float, default=0.6)
+  parser.add_argument('--error-rate', type=float, default=0.1)
+  parser.add_argument('--output', help='save the results as JSON')
+  parser.add_argument('--compare', help='print the difference to the results of an earlier run')
+  args = parser.parse_args()
+  games = {}
+  for name in args.games:
+    games[name] = measure(name, args.sessions, args.seed, args.reaction_time, args.error_rate)
+  baseline = None
+  if args.compare:
+    with open(args.compare) as previous:
+      baseline = load(previous)['games']
+  print_report(games, baseline)
+  if args.output:
+    with open(args.output, 'w') as output:
+      dump({'settings': vars(args), 'games': games}, output, indent=2)
@@ -0,0 +1,137 @@
+from argparse import ArgumentParser
+from datetime import datetime
+from json import loads
+from math import ceil
+from os import path
+from threading import Lock
+from time import time
+from uuid import uuid4
+import sqlite3
+
+# Constants
+
+LEADERBOARD_PATH = path.dirname(path.abspath(__file__)) + '/leaderboard.db'
+PERIODS = {'hour': '%Y-%m-%d %H:00', 'day': '%Y-%m-%d'}
+PERCENTS = (50, 90, 99)
+
+# Classes
+
+class Leaderboard(object):
+
+  def __init__(self, leaderboard_path=LEADERBOARD_PATH):
+    self.connection = sqlite3.connect(leaderboard_path, timeout=10, check_same_thread=False)
+    self.connection.execute('PRAGMA journal_mode=WAL')
+    self.connection.execute('CREATE TABLE IF NOT EXISTS scores (id TEXT PRIMARY KEY, game_reference TEXT NOT NULL, started_at REAL NOT NULL, completed_at REAL NOT NULL, score INTEGER NOT NULL, strikes INTEGER NOT NULL, max_score INTEGER, max_strikes INTEGER)')
+    self.connection.execute('CREATE INDEX IF NOT EXISTS scores_ranking ON scores (game_reference, score DESC, strikes, completed_at)')
+    self.connection.execute('CREATE INDEX IF NOT EXISTS scores_time ON scores (game_reference, completed_at)')
+    self.connection.commit()
+    self.lock = Lock()
+
+  def record(self, result, result_id=None):
+    row = (
+      result_id or uuid4().hex,
+      result['game_reference'],
+      result['started_at'],
+      result['completed_at'],
+      result['score'],
+      result['strikes'],
+      result.get('max_score'),
+      result.get('max_strikes')
+    )
+    with self.lock:
+      self.connection.execute('INSERT OR IGNORE INTO scores VALUES (?, ?, ?, ?, ?, ?, ?, ?)', row)
+      self.connection.commit()
+    return row[0]
+
+  def import_journal(self, journal_path):
+    source = sqlite3.connect(journal_path)
+    try:
+      rows = source.execute('SELECT id, record FROM results').fetchall()
+    finally:
+      source.close()
+    before = self.count()
+    for result_id, record in rows:
+      self.record(loads(record), result_id)
+    return self.count() - before
+
+  def games(self):
+    with self.lock:
+      return [r[0] for r in self.connection.execute('SELECT DISTINCT game_reference FROM scores ORDER BY game_reference')]
+
+  def count(self, game_reference=None, since=0):
+    with self.lock:
+      if game_reference is None:
+        return self.connection.execute('SELECT COUNT(*) FROM scores WHERE completed_at >= ?', (since,)).fetchone()[0]
+      return self.connection.execute('SELECT COUNT(*) FROM scores WHERE game_reference = ? AND completed_at >= ?', (game_reference, since)).fetchone()[0]
+
+  def top(self, game_reference, n=10, since=0):
+    with self.lock:
+      rows = self.connection.execute(
+        'SELECT score, strikes, completed_at - started_at, completed_at FROM scores WHERE game_reference = ? AND completed_at >= ? ' +
+        'ORDER BY score DESC, strikes, completed_at LIMIT ?', (game_reference, since, n)).fetchall()
+    return [{'score': r[0], 'strikes': r[1], 'duration': r[2], 'completed_at': r[3]} for r in rows]
+
+  def percentiles(self, game_reference, percents=PERCENTS):
+    total = self.count(game_reference)
+    values = {}
+    if total == 0:
+      return values
+    with self.lock:
+      for percent in percents:
+        offset = max(ceil(percent / 100 * total) - 1, 0)
+        values[percent] = self.connection.execute(
+          'SELECT score FROM scores WHERE game_reference = ? ORDER BY score LIMIT 1 OFFSET ?', (game_reference, offset)).fetchone()[0]
+    return values
+
+  def rank(self, game_reference, score):
+    total = self.count(game_reference)
+    if total == 0:
+      return 100.0
+    with self.lock:
+      below = self.connection.execute('SELECT COUNT(*) FROM scores WHERE game_reference = ? AND score < ?', (game_reference, score)).fetchone()[0]
+    return below * 100 / total
+
+  def aggregate(self, game_reference, period='day', since=0):
+    with self.lock:
+      rows = self.connection.execute(
+        "SELECT strftime(?, completed_at, 'unixepoch', 'localtime') AS bucket, COUNT(*), AVG(score), MAX(score), AVG(strikes) " +
+        'FROM scores WHERE game_reference = ? AND completed_at >= ? GROUP BY bucket ORDER BY bucket',
+        (PERIODS[period], game_reference, since)).fetchall()
+    return [{'period': r[0], 'plays': r[1], 'average_score': r[2], 'best_score': r[3], 'average_strikes': r[4]} for r in rows]
+
+  def close(self):
+    with self.lock:
+      self.connection.close()
+
+# Functions
+
+def print_game(leaderboard, game_reference, n, period, since):
+  print('{} ({} plays)'.format(game_reference, leaderboard.count(game_reference, since)))
+  for place, entry in enumerate(leaderboard.top(game_reference, n, since), 1):
+    print('  {:>3}. {:>4} points {:>2} strikes {:>7.0f}s  {}'.format(
+      place, entry['score'], entry['strikes'], entry['duration'], datetime.fromtimestamp(entry['completed_at']).strftime('%Y-%m-%d %H:%M')))
+  percentiles = leaderboard.percentiles(game_reference)
+  print('  Percentiles: ' + ', '.join('p{} {}'.format(p, v) for p, v in percentiles.items()))
+  for bucket in leaderboard.aggregate(game_reference, period, since):
+    print('  {:<16} {:>5} plays {:>6.1f} average {:>4} best {:>5.1f} strikes'.format(
+      bucket['period'], bucket['plays'], bucket['average_score'], bucket['best_score'], bucket['average_strikes']))
+
+# Main
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='Show the leaderboard and statistics of the games played on this box.')
+  parser.add_argument('games', nargs='*')
+  parser.add_argument('--top', type=int, default=10)
+  parser.add_argument('--period', choices=sorted(PERIODS), default='day')
+  parser.add_argument('--days', type=float, help='only include results of the last days')
+  parser.add_argument('--import-journal', metavar='PATH', help='add the results of a result journal first')
+  args = parser.parse_args()
+  leaderboard = Leaderboard()
+  if args.import_journal:
+    print('Imported {} results'.format(leaderboard.import_journal(args.import_journal)))
+  since = 0
+  if args.days is not None:
+    since = time() - args.days * 86400
+  for game_reference in args.games or leaderboard.games():
+    print_game(leaderboard, game_reference, args.top, args.period, since)
+  leaderboard.close()
@@ -0,0 +1,217 @@
+from bisect import bisect_left
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps
+from random import random
+from threading import Lock, Thread
+from time import perf_counter, time
+from urllib.parse import parse_qs, urlparse
+
+# Constants
+
+METRICS_HOST = '0.0.0.0'
+BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+MAX_SPANS = 1024
+
+# Variables
+
+registry = []
+spans = deque(maxlen=MAX_SPANS)
+sample_rate = 0.0
+server = None
+
+# Classes
+
+class Metric(object):
+
+  kind = None
+
+  def __init__(self, name, documentation, label_names=()):
+    self.name = name
+    self.documentation = documentation
+    self.label_names = label_names
+    self.children = {}
+    self.lock = Lock()
+    registry.append(self)
+
+  def labels(self, *values):
+    key = tuple(str(v) for v in values)
+    child = self.children.get(key)
+    if child is None:
+      with self.lock:
+        if key not in self.children:
+          self.children[key] = self._child(format_labels(self.label_names, key))
+        child = self.children[key]
+    return child
+
+  def expose(self):
+    lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} {}'.format(self.name, self.kind)]
+    for child in list(self.children.values()):
+      lines.extend(child.expose(self.name))
+    return lines
+
+class Counter(Metric):
+
+  kind = 'counter'
+
+  def _child(self, labels):
+    return CounterValue(labels)
+
+class CounterValue(object):
+
+  def __init__(self, labels):
+    self.labels = labels
+    self.value = 0
+    self.lock = Lock()
+
+  def inc(self, amount=1):
+    with self.lock:
+      self.value += amount
+
+  def expose(self, name):
+    return ['{}{} {}'.format(name, wrap_labels(self.labels), self.value)]
+
+class Gauge(Metric):
+
+  kind = 'gauge'
+
+  def _child(self, labels):
+    return GaugeValue(labels)
+
+class GaugeValue(CounterValue):
+
+  def set(self, value):
+    with self.lock:
+      self.value = value
+
+  def dec(self, amount=1):
+    self.inc(-amount)
+
+class Histogram(Metric):
+
+  kind = 'histogram'
+
+  def __init__(self, name, documentation, label_names=(), buckets=BUCKETS):
+    self.buckets = buckets
+    super().__init__(name, documentation, label_names)
+
+  def _child(self, labels):
+    return HistogramValue(self.name, labels, self.buckets)
+
+class HistogramValue(object):
+
+  def __init__(self, name, labels, buckets):
+    self.name = name
+    self.labels = labels
+    self.buckets = buckets
+    self.counts = [0] * (len(buckets) + 1)
+    self.sum = 0
+    self.lock = Lock()
+
+  def observe(self, value):
+    index = bisect_left(self.buckets, value)
+    with self.lock:
+      self.counts[index] += 1
+      self.sum += value
+
+  def time(self):
+    return Timer(self)
+
+  def expose(self, name):
+    with self.lock:
+      counts = list(self.counts)
+      total = self.sum
+    lines = []
+    cumulative = 0
+    separator = ',' if self.labels else ''
+    for bound, count in zip(self.buckets + ['+Inf'], counts):
+      cumulative += count
+      lines.append('{}_bucket{{{}{}le="{}"}} {}'.format(name, self.labels, separator, bound, cumulative))
+    lines.append('{}_sum{} {}'.format(name, wrap_labels(self.labels), total))
+    lines.append('{}_count{} {}'.format(name, wrap_labels(self.labels), cumulative))
+    return lines
+
+class Timer(object):
+
+  def __init__(self, histogram):
+    self.histogram = histogram
+
+  def __enter__(self):
+    self.started = perf_counter()
+    return self
+
+  def __exit__(self, kind, value, traceback):
+    duration = perf_counter() - self.started
+    self.histogram.observe(duration)
+    if sample_rate > 0 and random() < sample_rate:
+      spans.append((time() - duration, duration, self.histogram.name, self.histogram.labels, kind is not None))
+    return False
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+  def do_GET(self):
+    url = urlparse(self.path)
+    if url.path == '/metrics':
+      self._reply('text/plain; version=0.0.4', expose())
+    elif url.path == '/trace':
+      query = parse_qs(url.query)
+      if 'rate' in query:
+        try:
+          set_sample_rate(float(query['rate'][0]))
+        except ValueError:
+          self.send_error(400, 'rate must be a number between 0 and 1')
+          return
+      self._reply('application/x-ndjson', export_spans())
+    else:
+      self.send_error(404)
+
+  def log_message(self, format, *args):
+    pass
+
+  def _reply(self, content_type, body):
+    data = body.encode('utf-8')
+    self.send_response(200)
+    self.send_header('Content-Type', content_type)
+    self.send_header('Content-Length', str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+# Functions
+
+def format_labels(names, values):
+  return ','.join('{}="{}"'.format(n, v.replace('\\', '\\\\').replace('"', '\\"')) for n, v in zip(names, values))
+
+def wrap_labels(labels):
+  return '{' + labels + '}' if labels else ''
+
+def expose():
+  lines = []
+  for metric in list(registry):
+    lines.extend(metric.expose())
+  return '\n'.join(lines) + '\n'
+
+def set_sample_rate(rate):
+  global sample_rate
+  sample_rate = min(max(rate, 0.0), 1.0)
+
+def export_spans():
+  lines = ['{{"sample_rate": {}}}'.format(sample_rate)]
+  for started_at, duration, name, labels, failed in list(spans):
+    lines.append(dumps({'started_at': started_at, 'duration': duration, 'name': name, 'labels': labels, 'failed': failed}))
+  return '\n'.join(lines) + '\n'
+
+def start_server(port, host=METRICS_HOST):
+  global server
+  if port is None or server is not None:
+    return server
+  try:
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+  except OSError as e:
+    print('Unable to serve metrics on port {}: {}'.format(port, e))
+    return None
+  thread = Thread(target=server.serve_forever, name='metrics')
+  thread.daemon = True
+  thread.start()
+  return server
+
+LOOP_SECONDS = Histogram('game_loop_seconds', 'Duration of one iteration of a game loop.', ('game',))
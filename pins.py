@@ -0,0 +1,275 @@
+from clock import monotonic, sleep
+from gpiozero import Button, Device, GPIODevice, LED
+from gpiozero.pins.mock import MockFactory
+from metrics import Counter
+from mmap import mmap, MAP_SHARED, PROT_READ, PROT_WRITE
+from threading import Lock
+from time import perf_counter
+import animation
+import os
+
+# Constants
+
+INPUT = 'input'
+OUTPUT = 'output'
+GPIOMEM_PATH = '/dev/gpiomem'
+GPIOMEM_SIZE = 4096
+GPSET0 = 0x1C // 4
+GPCLR0 = 0x28 // 4
+GPLEV0 = 0x34 // 4
+
+# Variables
+
+reconfigurations = Counter('gpio_reconfigurations_total', 'Pin direction changes of bidirectional game pins.', ('direction',))
+to_input = reconfigurations.labels(INPUT)
+to_output = reconfigurations.labels(OUTPUT)
+input_mask = 0
+input_lock = Lock()
+registers = None
+
+# Classes
+
+class BidirectionalPin(GPIODevice):
+
+  def __init__(self, pin=None, pin_factory=None):
+    super().__init__(pin, pin_factory=pin_factory)
+    self._direction = None
+    self.when_pressed = None
+    self.when_released = None
+    self.as_input()
+
+  @property
+  def direction(self):
+    return self._direction
+
+  @property
+  def is_pressed(self):
+    return self._direction == INPUT and self.is_active
+
+  def as_input(self, stop_blink=True):
+    if self._direction == INPUT:
+      return
+    if stop_blink:
+      self._stop_blink()
+    to_input.inc()
+    set_input_bit(self.pin.number, True)
+    self.pin.function = INPUT
+    self.pin.pull = 'up'
+    self._active_state = False
+    self._inactive_state = True
+    self._direction = INPUT
+    self.pin.edges = 'both'
+    self.pin.when_changed = self._changed
+
+  def as_output(self):
+    if self._direction == OUTPUT:
+      return
+    to_output.inc()
+    set_input_bit(self.pin.number, False)
+    self.pin.when_changed = None
+    self.pin.function = OUTPUT
+    self._active_state = True
+    self._inactive_state = False
+    self.pin.state = False
+    self._direction = OUTPUT
+
+  def on(self):
+    self._stop_blink()
+    self.pin.state = True
+
+  def off(self):
+    self._stop_blink()
+    self.pin.state = False
+
+  def blink(self, on_time=1, off_time=1, n=None, background=True):
+    schedule = animation.blink([self], on_time, off_time, n)
+    if background:
+      animation.play(schedule)
+      return
+    animation.run(schedule)
+    while schedule.repeat:
+      animation.run(schedule)
+
+  def wait_for_press(self, timeout=None):
+    return self._wait_for(True, timeout)
+
+  def wait_for_release(self, timeout=None):
+    return self._wait_for(False, timeout)
+
+  def close(self):
+    self._stop_blink()
+    if self.pin is not None:
+      set_input_bit(self.pin.number, False)
+      self.pin.when_changed = None
+    super().close()
+
+  def _changed(self, ticks, state):
+    if state == self._active_state:
+      callback = self.when_pressed
+    else:
+      callback = self.when_released
+    if callback is not None:
+      callback(self)
+
+  def _stop_blink(self):
+    animation.stop([self])
+
+  def _wait_for(self, pressed, timeout):
+    start = monotonic()
+    while self.is_pressed != pressed:
+      if timeout is not None and monotonic() - start > timeout:
+        return False
+      sleep(0.01)
+    return True
+
+class RegisterBackend(object):
+
+  def __init__(self, registers):
+    self.registers = registers
+
+  def read(self):
+    return self.registers[GPLEV0]
+
+  def write(self, set_mask, clear_mask):
+    if set_mask:
+      self.registers[GPSET0] = set_mask
+    if clear_mask:
+      self.registers[GPCLR0] = clear_mask
+
+class DeviceBackend(object):
+
+  def __init__(self, devices):
+    self.pins = [(1 << d.pin.number, d.pin) for d in devices]
+
+  def read(self):
+    mask = 0
+    for bit, pin in self.pins:
+      if pin.state:
+        mask |= bit
+    return mask
+
+  def write(self, set_mask, clear_mask):
+    for bit, pin in self.pins:
+      if set_mask & bit:
+        pin.state = True
+      elif clear_mask & bit:
+        pin.state = False
+
+class PinPort(object):
+
+  def __init__(self, devices, backend=None):
+    self.devices = list(devices)
+    self.mask = 0
+    for d in self.devices:
+      self.mask |= bit(d)
+    self.backend = backend or open_backend(self.devices)
+
+  def read(self):
+    return self.backend.read() & self.mask
+
+  def active(self):
+    return (self.backend.read() ^ input_mask) & self.mask
+
+  def write(self, mask):
+    animation.stop(self.devices)
+    outputs = self.mask & ~input_mask
+    self.backend.write(mask & outputs, ~mask & outputs)
+
+  def sample(self):
+    with animation.paused():
+      outputs = [d for d in self.devices if d.direction == OUTPUT]
+      levels = self.read()
+      for d in outputs:
+        d.as_input(False)
+      active = self.active()
+      mask = 0
+      for d in outputs:
+        d.as_output()
+        mask |= bit(d)
+      self.backend.write(levels & mask, ~levels & mask)
+    return active
+
+  def on(self):
+    self.write(self.mask)
+
+  def off(self):
+    self.write(0)
+
+# Functions
+
+def bit(device):
+  return 1 << device.pin.number
+
+def set_input_bit(number, is_input):
+  global input_mask
+  with input_lock:
+    if is_input:
+      input_mask |= 1 << number
+    else:
+      input_mask &= ~(1 << number)
+
+def open_registers(path=GPIOMEM_PATH):
+  global registers
+  if registers is None:
+    fd = os.open(path, os.O_RDWR | os.O_SYNC)
+    try:
+      registers = memoryview(mmap(fd, GPIOMEM_SIZE, MAP_SHARED, PROT_READ | PROT_WRITE)).cast('I')
+    finally:
+      os.close(fd)
+  return registers
+
+def open_backend(devices):
+  if not isinstance(Device.pin_factory, MockFactory):
+    try:
+      return RegisterBackend(open_registers())
+    except OSError:
+      pass
+  return DeviceBackend(devices)
+
+def set_face_as_inputs(face):
+  for p in face:
+    p.as_input()
+
+def set_face_as_outputs(face):
+  for p in face:
+    p.as_output()
+
+def benchmark(numbers, iterations=100):
+  start = perf_counter()
+  for _ in range(iterations):
+    devices = [Button(n) for n in numbers]
+    for d in devices:
+      d.close()
+    devices = [LED(n) for n in numbers]
+    for d in devices:
+      d.close()
+  rebuild_time = (perf_counter() - start) / (iterations * 2)
+  face = [BidirectionalPin(n) for n in numbers]
+  start = perf_counter()
+  for _ in range(iterations):
+    set_face_as_outputs(face)
+    set_face_as_inputs(face)
+  flip_time = (perf_counter() - start) / (iterations * 2)
+  port = PinPort(face)
+  start = perf_counter()
+  for _ in range(iterations):
+    [p.value for p in face]
+  pin_scan_time = (perf_counter() - start) / iterations
+  start = perf_counter()
+  for _ in range(iterations):
+    port.active()
+  port_scan_time = (perf_counter() - start) / iterations
+  for p in face:
+    p.close()
+  return rebuild_time, flip_time, pin_scan_time, port_scan_time, type(port.backend).__name__
+
+# Main
+
+if __name__ == '__main__':
+  Device.pin_factory = MockFactory()
+  numbers = [4, 17, 27, 22, 10, 9, 11, 0, 5, 6, 13, 19, 23, 24, 18]
+  rebuild_time, flip_time, pin_scan_time, port_scan_time, backend = benchmark(numbers)
+  print('Reconfigure {} pins by rebuilding devices: {:.3f} ms'.format(len(numbers), rebuild_time * 1000))
+  print('Reconfigure {} pins by switching direction: {:.3f} ms'.format(len(numbers), flip_time * 1000))
+  print('Scan {} pins one at a time: {:.3f} ms'.format(len(numbers), pin_scan_time * 1000))
+  print('Scan {} pins through a port ({}): {:.3f} ms'.format(len(numbers), backend, port_scan_time * 1000))
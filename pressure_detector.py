@@ -0,0 +1,151 @@
+from time import perf_counter
+import numpy as np
+import sys
+
+# Constants
+
+ACHIEVED = 'achieved'
+TOO_MUCH = 'too_much'
+MEDIAN_WINDOW = 5
+EMA_ALPHA = 0.3
+EMA_CHUNK = 64
+HYSTERESIS = 10
+DWELL_TIME = 1.0
+WINDOWS = [(200, 300), (400, 500), (600, 700)]
+
+# Classes
+
+class PressureDetector(object):
+
+  def __init__(self, min_pressure=0, max_pressure=0, hysteresis=HYSTERESIS, dwell_time=DWELL_TIME, median_window=MEDIAN_WINDOW, alpha=EMA_ALPHA):
+    self.min_pressure = min_pressure
+    self.max_pressure = max_pressure
+    self.hysteresis = hysteresis
+    self.dwell_time = dwell_time
+    self.median_window = median_window
+    self.alpha = alpha
+    self.reset()
+
+  def set_window(self, min_pressure, max_pressure):
+    if (min_pressure, max_pressure) != (self.min_pressure, self.max_pressure):
+      self.min_pressure = min_pressure
+      self.max_pressure = max_pressure
+      self.reset()
+
+  def reset(self):
+    self.history = None
+    self.filtered = None
+    self.inside = False
+    self.inside_since = None
+    self.over = False
+
+  def filter(self, values):
+    keep = self.median_window - 1
+    if self.history is None:
+      self.history = np.repeat(values[0], keep)
+    raw = np.concatenate((self.history, values))
+    self.history = raw[len(raw) - keep:]
+    windows = np.lib.stride_tricks.as_strided(raw, (len(values), self.median_window), (raw.strides[0], raw.strides[0]))
+    medians = np.median(windows, axis=1)
+    if self.filtered is None:
+      self.filtered = medians[0]
+    filtered = ema(medians, self.alpha, self.filtered)
+    self.filtered = filtered[-1]
+    return filtered
+
+  def update(self, samples):
+    if len(samples) == 0:
+      return None
+    data = np.asarray(samples, dtype=float)
+    times = data[:, 0]
+    pressure = self.filter(data[:, 1])
+    low = self.min_pressure
+    high = self.max_pressure
+    band = self.hysteresis
+    inside = hysteresis((pressure > low + band) & (pressure < high - band), (pressure < low - band) | (pressure > high + band), self.inside)
+    over = hysteresis(pressure > high + band, pressure < high - band, self.over)
+    index = np.arange(len(pressure))
+    entered = inside & ~np.concatenate(([self.inside], inside[:-1]))
+    run_start = np.maximum.accumulate(np.where(entered, index, -1))
+    previous_since = self.inside_since if self.inside_since is not None else np.inf
+    since = np.where(run_start >= 0, times[np.maximum(run_start, 0)], previous_since)
+    achieved = inside & (times - since >= self.dwell_time)
+    strikes = over & ~np.concatenate(([self.over], over[:-1]))
+    first_achieved = np.argmax(achieved) if achieved.any() else len(pressure)
+    first_strike = np.argmax(strikes) if strikes.any() else len(pressure)
+    if first_strike < len(pressure) and first_strike <= first_achieved:
+      self.over = bool(over[-1])
+      self.inside = False
+      self.inside_since = None
+      return TOO_MUCH
+    if first_achieved < len(pressure):
+      self.inside = False
+      self.inside_since = None
+      self.over = bool(over[-1])
+      return ACHIEVED
+    self.over = bool(over[-1])
+    self.inside = bool(inside[-1])
+    self.inside_since = float(since[-1]) if self.inside else None
+    return None
+
+# Functions
+
+def ema(values, alpha, initial):
+  filtered = np.empty(len(values))
+  decay = 1 - alpha
+  for start in range(0, len(values), EMA_CHUNK):
+    chunk = values[start:start + EMA_CHUNK]
+    powers = decay ** np.arange(len(chunk))
+    filtered[start:start + len(chunk)] = alpha * powers * np.cumsum(chunk / powers) + initial * decay * powers
+    initial = filtered[start + len(chunk) - 1]
+  return filtered
+
+def hysteresis(enter, leave, state):
+  events = np.where(enter, 1, np.where(leave, -1, 0))
+  last = np.maximum.accumulate(np.where(events != 0, np.arange(len(events)), -1))
+  return np.where(last >= 0, events[np.maximum(last, 0)] > 0, state)
+
+def load_trace(trace_path):
+  return np.loadtxt(trace_path, delimiter=',', ndmin=2)
+
+def synthesize_trace(rate=500, seed=0):
+  generator = np.random.default_rng(seed)
+  levels = [0, 250, 0, 450, 0, 650, 0]
+  values = np.concatenate([np.full(rate * 3, level, dtype=float) for level in levels])
+  values += generator.normal(0, 8, len(values))
+  spikes = generator.choice(len(values), len(values) // 500, replace=False)
+  values[spikes] = 999
+  times = np.arange(len(values)) / rate
+  return np.column_stack((times, np.clip(values, 0, 999)))
+
+def replay_legacy(trace, min_pressure, max_pressure):
+  strikes = 0
+  hold_until = 0
+  for timestamp, value in trace:
+    if timestamp < hold_until:
+      continue
+    if value > max_pressure:
+      strikes += 1
+      hold_until = timestamp + 4
+  return strikes
+
+def replay(trace, min_pressure, max_pressure, batch=50):
+  detector = PressureDetector(min_pressure, max_pressure)
+  events = {ACHIEVED: 0, TOO_MUCH: 0}
+  start = perf_counter()
+  for i in range(0, len(trace), batch):
+    event = detector.update(trace[i:i + batch])
+    if event is not None:
+      events[event] += 1
+  return events, perf_counter() - start
+
+# Main
+
+if __name__ == '__main__':
+  traces = [(p, load_trace(p)) for p in sys.argv[1:]] or [('synthetic', synthesize_trace())]
+  for name, trace in traces:
+    for min_pressure, max_pressure in WINDOWS:
+      events, elapsed = replay(trace, min_pressure, max_pressure)
+      print('{} {}-{}: {} samples in {:.1f} ms ({:.0f} samples/s), achieved {}, too much {}, legacy too much {}'.format(
+        name, min_pressure, max_pressure, len(trace), elapsed * 1000, len(trace) / elapsed,
+        events[ACHIEVED], events[TOO_MUCH], replay_legacy(trace, min_pressure, max_pressure)))
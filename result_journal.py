@@ -0,0 +1,123 @@
+from connectivity import connection
+from json import dumps, loads
+from metrics import Counter, Gauge
+from os import path
+from threading import Event, Lock, Thread
+from time import monotonic, time
+from uuid import uuid4
+import sqlite3
+
+# Constants
+
+JOURNAL_PATH = path.dirname(path.abspath(__file__)) + '/results.db'
+RESULTS_COLLECTION = 'results'
+BATCH_SIZE = 20
+
+# Variables
+
+backlog_size = Gauge('result_journal_backlog', 'Results in the local journal that are not uploaded yet.').labels()
+uploaded_results = Counter('result_journal_uploaded_total', 'Results uploaded from the local journal to firestore.').labels()
+upload_errors = Counter('result_journal_errors_total', 'Batches of results that failed to upload.').labels()
+upload_throughput = Gauge('result_journal_throughput', 'Results per second uploaded by the last batch.').labels()
+
+# Classes
+
+class ResultJournal(object):
+
+  def __init__(self, store, journal_path=JOURNAL_PATH, batch_size=BATCH_SIZE):
+    self.store = store
+    self.batch_size = batch_size
+    self.connection = sqlite3.connect(journal_path, timeout=10, check_same_thread=False)
+    self.connection.execute('PRAGMA journal_mode=WAL')
+    self.connection.execute('PRAGMA synchronous=FULL')
+    self.connection.execute('CREATE TABLE IF NOT EXISTS results (id TEXT PRIMARY KEY, record TEXT NOT NULL, created_at REAL NOT NULL, uploaded_at REAL)')
+    self.connection.execute('CREATE INDEX IF NOT EXISTS results_pending ON results (uploaded_at, created_at)')
+    self.connection.commit()
+    self.lock = Lock()
+    self.wake = Event()
+    self.stats = {
+      'uploaded': 0,
+      'batches': 0,
+      'errors': 0,
+      'throughput': 0
+    }
+    self.running = False
+    self.thread = None
+
+  def start(self):
+    if self.running:
+      return
+    self.running = True
+    backlog_size.set(self.backlog())
+    connection.subscribe(self._connection_changed)
+    self.thread = Thread(target=self._run, name='result-journal')
+    self.thread.daemon = True
+    self.thread.start()
+
+  def append(self, record):
+    result_id = uuid4().hex
+    with self.lock:
+      self.connection.execute('INSERT INTO results (id, record, created_at) VALUES (?, ?, ?)', (result_id, dumps(record), time()))
+      self.connection.commit()
+    backlog_size.set(self.backlog())
+    self.wake.set()
+    return result_id
+
+  def backlog(self):
+    with self.lock:
+      return self.connection.execute('SELECT COUNT(*) FROM results WHERE uploaded_at IS NULL').fetchone()[0]
+
+  def upload(self):
+    with self.lock:
+      rows = self.connection.execute('SELECT id, record FROM results WHERE uploaded_at IS NULL ORDER BY created_at LIMIT ?', (self.batch_size,)).fetchall()
+    if len(rows) == 0:
+      return 0
+    start = monotonic()
+    batch = self.store.batch()
+    collection = self.store.collection(RESULTS_COLLECTION)
+    for result_id, record in rows:
+      batch.set(collection.document(result_id), loads(record))
+    batch.commit()
+    elapsed = monotonic() - start
+    with self.lock:
+      self.connection.executemany('UPDATE results SET uploaded_at = ? WHERE id = ?', [(time(), r[0]) for r in rows])
+      self.connection.commit()
+    self.stats['uploaded'] += len(rows)
+    self.stats['batches'] += 1
+    uploaded_results.inc(len(rows))
+    backlog_size.set(self.backlog())
+    if elapsed > 0:
+      self.stats['throughput'] = len(rows) / elapsed
+      upload_throughput.set(self.stats['throughput'])
+    return len(rows)
+
+  def close(self, timeout=None):
+    if self.running:
+      self.running = False
+      self.wake.set()
+      self.thread.join(timeout)
+    with self.lock:
+      self.connection.close()
+
+  def _connection_changed(self, online):
+    if online:
+      self.wake.set()
+
+  def _run(self):
+    while self.running:
+      timeout = None
+      if connection.ready():
+        try:
+          uploaded = self.upload()
+          if uploaded > 0:
+            connection.succeeded()
+          if uploaded == self.batch_size:
+            continue
+        except Exception:
+          self.stats['errors'] += 1
+          upload_errors.inc()
+          connection.failed()
+      if self.backlog() > 0:
+        timeout = connection.delay()
+      self.wake.wait(timeout)
+      self.wake.clear()
@@ -0,0 +1,78 @@
+from binascii import crc_hqx
+from metrics import Counter
+from struct import Struct
+
+# Constants
+
+# Frame layout: sync (0xAA 0x55), sequence number (uint8), value (uint16 LE), CRC-16/CCITT of sequence and value (uint16 LE)
+
+SYNC = b'\xaa\x55'
+FRAME = Struct('<2sBHH')
+PAYLOAD = Struct('<BH')
+FRAME_SIZE = FRAME.size
+CRC_SEED = 0xFFFF
+MAX_BUFFERED = 4096
+ERRORS = ['corrupt', 'dropped', 'out_of_range']
+
+# Variables
+
+decoded_frames = Counter('serial_frames_total', 'Binary frames with a valid CRC read from the arduino.').labels()
+frame_errors = Counter('serial_frame_errors_total', 'Binary frames that were corrupt, dropped by the link or out of range.', ('kind',))
+
+# Classes
+
+class FrameDecoder(object):
+
+  def __init__(self, max_value=0xFFFF):
+    self.max_value = max_value
+    self.buffer = bytearray()
+    self.sequence = None
+    self.stats = {
+      'frames': 0,
+      'corrupt': 0,
+      'dropped': 0,
+      'out_of_range': 0
+    }
+    self.errors = dict((kind, frame_errors.labels(kind)) for kind in ERRORS)
+
+  def feed(self, data):
+    buffer = self.buffer
+    buffer.extend(data)
+    values = []
+    position = 0
+    end = len(buffer) - FRAME_SIZE
+    while position <= end:
+      if buffer[position:position + 2] != SYNC:
+        position = buffer.find(SYNC, position + 1)
+        if position < 0:
+          position = len(buffer) - 1
+          break
+        continue
+      sync, sequence, value, crc = FRAME.unpack_from(buffer, position)
+      if crc_hqx(buffer[position + 2:position + 5], CRC_SEED) != crc:
+        self.stats['corrupt'] += 1
+        self.errors['corrupt'].inc()
+        position += 1
+        continue
+      position += FRAME_SIZE
+      if self.sequence is not None:
+        dropped = (sequence - self.sequence - 1) & 0xFF
+        if dropped > 0:
+          self.stats['dropped'] += dropped
+          self.errors['dropped'].inc(dropped)
+      self.sequence = sequence
+      self.stats['frames'] += 1
+      decoded_frames.inc()
+      if value > self.max_value:
+        self.stats['out_of_range'] += 1
+        self.errors['out_of_range'].inc()
+        continue
+      values.append(value)
+    del buffer[:max(position, len(buffer) - MAX_BUFFERED)]
+    return values
+
+# Functions
+
+def encode_frame(sequence, value):
+  payload = PAYLOAD.pack(sequence & 0xFF, value)
+  return SYNC + payload + crc_hqx(payload, CRC_SEED).to_bytes(2, 'little')
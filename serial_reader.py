@@ -0,0 +1,139 @@
+from clock import monotonic
+from collections import deque
+from metrics import Counter, Histogram
+from threading import Condition, Event, Thread
+import serial
+
+# Constants
+
+BUFFER_SIZE = 1024
+READ_TIMEOUT = 0.1
+RECONNECT_INTERVAL = 1
+
+# Variables
+
+read_seconds = Histogram('serial_read_seconds', 'Time from a serial read returning data until its samples are published.', ('port',))
+received_samples = Counter('serial_samples_total', 'Samples decoded from a serial port.', ('port',))
+read_errors = Counter('serial_errors_total', 'Serial read errors, after which the port is reopened.', ('port',))
+
+# Classes
+
+class LineDecoder(object):
+
+  def __init__(self, parse):
+    self.parse = parse
+    self.buffer = bytearray()
+
+  def feed(self, data):
+    self.buffer.extend(data)
+    lines = self.buffer.split(b'\n')
+    self.buffer = lines.pop()
+    return [self.parse(bytes(line) + b'\n') for line in lines]
+
+class SerialReader(object):
+
+  def __init__(self, port, baud, decoder, size=BUFFER_SIZE):
+    self.port = port
+    self.baud = baud
+    self.decoder = decoder
+    self.samples = deque(maxlen=size)
+    self.condition = Condition()
+    self.when_changed = None
+    self.received = 0
+    self.running = False
+    self.stopped = Event()
+    self.serial = None
+    self.thread = None
+
+  def start(self):
+    if self.running:
+      return
+    self.serial = serial.Serial(self.port, self.baud, timeout=READ_TIMEOUT)
+    self.running = True
+    self.stopped.clear()
+    self.thread = Thread(target=self._run, name='serial-reader')
+    self.thread.daemon = True
+    self.thread.start()
+
+  def latest(self):
+    with self.condition:
+      if len(self.samples) == 0:
+        return None
+      return self.samples[-1]
+
+  def samples_since(self, timestamp):
+    with self.condition:
+      found = []
+      for sample in reversed(self.samples):
+        if sample[0] <= timestamp:
+          break
+        found.append(sample)
+    found.reverse()
+    return found
+
+  def wait_for_sample(self, timestamp=0, timeout=None):
+    with self.condition:
+      self.condition.wait_for(lambda: len(self.samples) > 0 and self.samples[-1][0] > timestamp, timeout)
+      if len(self.samples) == 0 or self.samples[-1][0] <= timestamp:
+        return None
+      return self.samples[-1]
+
+  def wait_for_change(self, timeout=None):
+    with self.condition:
+      current = self.samples[-1][1] if len(self.samples) > 0 else None
+      changed = lambda: len(self.samples) > 0 and self.samples[-1][1] != current
+      if not self.condition.wait_for(changed, timeout):
+        return None
+      return self.samples[-1]
+
+  def close(self):
+    self.running = False
+    self.stopped.set()
+    if self.thread is not None:
+      self.thread.join()
+      self.thread = None
+    self._disconnect()
+
+  def _run(self):
+    latency = read_seconds.labels(self.port)
+    samples = received_samples.labels(self.port)
+    errors = read_errors.labels(self.port)
+    while self.running:
+      try:
+        if self.serial is None:
+          self.serial = serial.Serial(self.port, self.baud, timeout=READ_TIMEOUT)
+        data = self.serial.read(self.serial.in_waiting or 1)
+        if len(data) == 0:
+          continue
+        with latency.time():
+          values = self.decoder.feed(data)
+          if len(values) > 0:
+            self._extend(values)
+        samples.inc(len(values))
+      except Exception as e:
+        if not self.running:
+          break
+        errors.inc()
+        print('Serial error on {}, reopening in {} seconds: {}'.format(self.port, RECONNECT_INTERVAL, e))
+        self._disconnect()
+        self.stopped.wait(RECONNECT_INTERVAL)
+
+  def _disconnect(self):
+    if self.serial is None:
+      return
+    try:
+      self.serial.close()
+    except Exception:
+      pass
+    self.serial = None
+
+  def _extend(self, values):
+    timestamp = monotonic()
+    with self.condition:
+      previous = self.samples[-1][1] if len(self.samples) > 0 else None
+      for value in values:
+        self.samples.append((timestamp, value))
+      self.received += len(values)
+      self.condition.notify_all()
+    if values[-1] != previous and self.when_changed is not None:
+      self.when_changed(timestamp, values[-1])
@@ -0,0 +1,42 @@
+from time import time
+
+# Classes
+
+class Session(object):
+
+  def __init__(self, game_id, max_score, max_strikes):
+    self.game_id = game_id
+    self.max_score = max_score
+    self.max_strikes = max_strikes
+    self.reset()
+
+  def reset(self):
+    self.started_at = 0
+    self.completed_at = 0
+    self.score = 0
+    self.strikes = 0
+
+  def start(self):
+    self.reset()
+    self.started_at = time()
+    return self.started_at
+
+  def update(self, score, strikes):
+    self.score = score
+    self.strikes = strikes
+
+  def complete(self, score, strikes):
+    self.update(score, strikes)
+    self.completed_at = time()
+    return self.completed_at
+
+  def to_result(self):
+    return {
+      'game_reference': self.game_id,
+      'started_at': self.started_at,
+      'completed_at': self.completed_at,
+      'score': self.score,
+      'strikes': self.strikes,
+      'max_score': self.max_score,
+      'max_strikes': self.max_strikes
+    }
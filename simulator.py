@@ -0,0 +1,745 @@
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory, MockPin
+from heapq import heappop, heappush
+from importlib import import_module
+from itertools import count
+from leaderboard import Leaderboard
+from math import exp
+from os import devnull, path
+from pressure_detector import HYSTERESIS
+from random import Random
+from result_journal import ResultJournal
+from serial_protocol import encode_frame, FrameDecoder
+from serial_reader import SerialReader
+from time import perf_counter
+import animation
+import clock
+import firebase
+import random
+import sys
+import types
+import wave
+
+# Constants
+
+GAMES = ['simon_says_game', 'follow_the_leader_game', 'push_pull_game', 'under_pressure_game', 'dial_it_in_game']
+TICK = 0.05
+START_HOLD = 0.3
+SAMPLE_INTERVAL = 0.02
+ARDUINO_BOOT_TIME = 2.5
+MAX_SESSION_TIME = 3600
+MEMORY_SPAN = 7
+PERCEPTION_TIME = 0.25
+PRESSURE_PRECISION = 15
+REAIM_TIME = 3
+SWITCH_LEVELS = {0: (None, None), 1: (None, False), 2: (False, False)}
+
+# Variables
+
+monitor = None
+games = {}
+
+# Classes
+
+class SimulationStalled(Exception):
+  pass
+
+class SimulationTimeout(Exception):
+  pass
+
+class VirtualTimer(object):
+
+  def __init__(self, function, args):
+    self.function = function
+    self.args = args
+    self.cancelled = False
+
+  def cancel(self):
+    self.cancelled = True
+
+class VirtualClock(object):
+
+  def __init__(self):
+    self.now = 0.0
+    self.timers = []
+    self.counter = count()
+
+  def monotonic(self):
+    return self.now
+
+  def sleep(self, seconds):
+    self.advance(self.now + max(seconds, 0))
+
+  def wait(self, event, timeout=None):
+    return self.wait_until(event.is_set, timeout)
+
+  def call_later(self, delay, function, args=()):
+    timer = VirtualTimer(function, args)
+    heappush(self.timers, (self.now + max(delay, 0), next(self.counter), timer))
+    return timer
+
+  def advance(self, until):
+    while len(self.timers) > 0 and self.timers[0][0] <= until:
+      self._fire()
+    self.now = max(self.now, until)
+
+  def wait_until(self, predicate, timeout=None):
+    deadline = None if timeout is None else self.now + timeout
+    while not predicate():
+      if len(self.timers) == 0 or deadline is not None and self.timers[0][0] > deadline:
+        if deadline is None:
+          raise SimulationStalled('Nothing left to run at {:.3f}s'.format(self.now))
+        self.now = max(self.now, deadline)
+        return predicate()
+      self._fire()
+    return True
+
+  def _fire(self):
+    when, _, timer = heappop(self.timers)
+    self.now = max(self.now, when)
+    if not timer.cancelled:
+      timer.function(*timer.args)
+
+class SwitchPin(MockPin):
+
+  def __init__(self, factory, number):
+    self.level = None
+    super().__init__(factory, number)
+
+  def set_level(self, level):
+    self.level = level
+    if self._function != 'input':
+      return
+    if level is None:
+      level = self._pull != 'down'
+    if level:
+      self.drive_high()
+    else:
+      self.drive_low()
+
+  def _set_pull(self, value):
+    super()._set_pull(value)
+    if self.level is not None:
+      self._change_state(self.level)
+
+  def _set_state(self, value):
+    super()._set_state(value)
+    if value and monitor is not None and not animation.animator.drawing:
+      monitor.led(self.number)
+
+class StubSound(object):
+
+  def __init__(self, sound_path):
+    self.name = path.basename(sound_path)
+    with wave.open(sound_path) as sound:
+      self.length = sound.getnframes() / sound.getframerate()
+
+  def get_length(self):
+    return self.length
+
+class StubChannel(object):
+
+  def __init__(self, channel_id):
+    self.channel_id = channel_id
+
+  def play(self, sound):
+    if monitor is not None:
+      monitor.sound(sound.name)
+
+  def stop(self):
+    pass
+
+class StubMixer(object):
+
+  Sound = StubSound
+  Channel = StubChannel
+
+  def __init__(self):
+    self.initialized = False
+
+  def init(self):
+    self.initialized = True
+
+  def quit(self):
+    self.initialized = False
+
+  def get_init(self):
+    return self.initialized
+
+  def set_num_channels(self, count):
+    pass
+
+  def set_reserved(self, count):
+    pass
+
+class StubGPIO(object):
+
+  BCM = 'BCM'
+  OUT = 'OUT'
+
+  def __init__(self):
+    self.levels = {}
+    self.when_output = None
+
+  def setmode(self, mode):
+    pass
+
+  def setup(self, channel, direction, initial=0):
+    self.levels[channel] = initial
+
+  def output(self, channel, value):
+    self.levels[channel] = value
+    if self.when_output is not None:
+      self.when_output(channel, value)
+
+  def cleanup(self):
+    self.levels.clear()
+
+class LocalReference(object):
+
+  def __init__(self, database, path):
+    self.database = database
+    self.path = path.strip('/')
+
+  def child(self, name):
+    return LocalReference(self.database, self.path + '/' + name)
+
+  def get(self):
+    node = self.database.data
+    for key in self._keys():
+      if not isinstance(node, dict) or key not in node:
+        return None
+      node = node[key]
+    return node
+
+  def set(self, value):
+    keys = self._keys()
+    if len(keys) == 0:
+      self.database.data = value
+    else:
+      self._parent(keys)[keys[-1]] = value
+    self.database.writes += 1
+
+  def update(self, values):
+    node = self.get()
+    if not isinstance(node, dict):
+      node = {}
+      self.set(node)
+    node.update(values)
+    self.database.writes += 1
+
+  def _keys(self):
+    return [k for k in self.path.split('/') if k != '']
+
+  def _parent(self, keys):
+    node = self.database.data
+    for key in keys[:-1]:
+      if not isinstance(node.get(key), dict):
+        node[key] = {}
+      node = node[key]
+    return node
+
+class LocalDatabase(object):
+
+  def __init__(self):
+    self.data = {}
+    self.writes = 0
+
+  def reference(self, path='/'):
+    return LocalReference(self, path)
+
+class LocalDocument(object):
+
+  def __init__(self, collection, document_id):
+    self.collection = collection
+    self.id = document_id
+
+  def set(self, record):
+    self.collection.documents[self.id] = dict(record)
+
+  def get(self):
+    return self.collection.documents.get(self.id)
+
+class LocalCollection(object):
+
+  def __init__(self):
+    self.documents = {}
+
+  def document(self, document_id):
+    return LocalDocument(self, document_id)
+
+class LocalBatch(object):
+
+  def __init__(self):
+    self.writes = []
+
+  def set(self, document, record):
+    self.writes.append((document, record))
+
+  def commit(self):
+    for document, record in self.writes:
+      document.set(record)
+    self.writes = []
+
+class LocalStore(object):
+
+  def __init__(self):
+    self.collections = {}
+
+  def collection(self, name):
+    if name not in self.collections:
+      self.collections[name] = LocalCollection()
+    return self.collections[name]
+
+  def batch(self):
+    return LocalBatch()
+
+class SimulatedArduino(SerialReader):
+
+  def __init__(self, clock, sample, binary, port, baud, decoder):
+    super().__init__(port, baud, decoder)
+    self.clock = clock
+    self.sample = sample
+    self.binary = binary
+    self.sequence = 0
+
+  def start(self):
+    if self.running:
+      return
+    self.running = True
+    self.clock.call_later(SAMPLE_INTERVAL, self._send)
+
+  def wait_for_sample(self, timestamp=0, timeout=None):
+    self.clock.wait_until(lambda: len(self.samples) > 0 and self.samples[-1][0] > timestamp, timeout)
+    return super().wait_for_sample(timestamp, 0)
+
+  def wait_for_change(self, timeout=None):
+    current = self.samples[-1][1] if len(self.samples) > 0 else None
+    self.clock.wait_until(lambda: len(self.samples) > 0 and self.samples[-1][1] != current, timeout)
+    return super().wait_for_change(0)
+
+  def close(self):
+    self.running = False
+
+  def _send(self):
+    if not self.running:
+      return
+    value = self.sample()
+    if self.binary:
+      data = encode_frame(self.sequence, value)
+      self.sequence = (self.sequence + 1) & 0xFF
+    else:
+      data = '{}\r\n'.format(value).encode('utf-8')
+    values = self.decoder.feed(data)
+    if len(values) > 0:
+      self._extend(values)
+    self.clock.call_later(SAMPLE_INTERVAL, self._send)
+
+class Player(object):
+
+  def __init__(self, seed=0, reaction_time=0.6, error_rate=0.05):
+    self.random = Random(seed)
+    self.reaction_time = reaction_time
+    self.error_rate = error_rate
+    self.simulation = None
+    self.module = None
+    self.game = None
+    self.running = False
+    self.started_at = 0
+
+  def attach(self, simulation):
+    self.simulation = simulation
+    self.module = simulation.module
+    self.game = simulation.game
+
+  def start(self):
+    self.running = True
+    self.started_at = self.simulation.clock.now
+    self.reset()
+    self.later(TICK, self._tick)
+
+  def stop(self):
+    self.running = False
+
+  def reset(self):
+    pass
+
+  def act(self):
+    pass
+
+  def sample(self):
+    return 0
+
+  def gpio_changed(self, channel, value):
+    pass
+
+  def interact(self, kind, leds=(), sounds=()):
+    if monitor is not None:
+      monitor.interaction(kind, leds, sounds)
+
+  def delay(self):
+    return max(0.05, self.random.gauss(self.reaction_time, self.reaction_time / 4))
+
+  def mistake(self):
+    return self.random.random() < self.error_rate
+
+  def later(self, delay, function, *args):
+    return self.simulation.clock.call_later(delay, function, args)
+
+  def pin(self, number):
+    return Device.pin_factory.pin(number)
+
+  def _tick(self):
+    if not self.running:
+      return
+    if self.simulation.clock.now - self.started_at > MAX_SESSION_TIME:
+      self.running = False
+      raise SimulationTimeout('Session did not finish within {} seconds'.format(MAX_SESSION_TIME))
+    if self.simulation.in_play and self.game.playing():
+      self.act()
+    self.later(TICK, self._tick)
+
+class SimonSaysPlayer(Player):
+
+  def reset(self):
+    self.step = 0
+    self.busy = False
+
+  def act(self):
+    io = self.game.io
+    directions = set(p.direction for p in io)
+    if directions == {'output'}:
+      self.step = 0
+      return
+    if self.busy or directions != {'input'} or self.step >= self.game.state.level:
+      return
+    target = self.game.state.generated_sequence[self.step]
+    if self.random.random() < self.recall_error():
+      target = self.random.choice([p for p in self.module.PINS if p != target])
+    self.busy = True
+    self.later(self.delay(), self.press, target)
+
+  def recall_error(self):
+    state = self.game.state
+    flash = state.velocity / 1000
+    return min(1, self.error_rate * (1 + state.level / MEMORY_SPAN) * max(1, PERCEPTION_TIME / flash))
+
+  def press(self, number):
+    pin = self.pin(number)
+    pin.set_level(False)
+    self.later(0.1, self.release, pin)
+
+  def release(self, pin):
+    pin.set_level(None)
+    self.interact('button', [pin.number], ['button_pressed.wav'])
+    self.step += 1
+    self.busy = False
+
+class FollowTheLeaderPlayer(Player):
+
+  def reset(self):
+    self.handled = None
+    for p in self.game.io:
+      p.pin.set_level(None)
+
+  def act(self):
+    state = self.game.state
+    key = (state.mode, state.level)
+    if self.handled == key or state.mode == 'done' or state.level > self.module.MAX_LEVEL:
+      return
+    self.handled = key
+    io = self.game.io
+    level = self.game.levels[state.mode][state.level - 1]
+    targets = [io.index(led) for led in level.leds]
+    forbidden = [i for i, p in enumerate(io) if level.forbidden & (1 << p.pin.number) and p.direction == 'input']
+    if self.mistake() and len(forbidden) > 0:
+      self.later(self.delay() / 2, self.flip_wrong, key, self.random.choice(forbidden))
+    self.later(self.delay(), self.flip, targets, 'switch' if len(targets) == 1 else 'both_switches')
+
+  def flip_wrong(self, key, index):
+    state = self.game.state
+    if (state.mode, state.level) == key:
+      self.flip([index], 'wrong_switch')
+
+  def flip(self, indices, interaction):
+    for index in indices:
+      pin = self.game.io[index].pin
+      pin.set_level(None if pin.level is False else False)
+    if interaction == 'wrong_switch':
+      self.interact(interaction, sounds=['boop.wav'])
+    else:
+      self.interact(interaction, [self.module.PINS[i] for i in indices], ['beep.wav'])
+
+class PushPullPlayer(Player):
+
+  def reset(self):
+    self.positions = [0] * self.module.MAX_STATES
+    self.moving = set()
+    for s in range(self.module.MAX_STATES):
+      self.set_position(s, 0)
+
+  def act(self):
+    targets = self.game.state.targets
+    for s in range(self.module.MAX_STATES):
+      if s in self.moving or targets[s] is None or targets[s] == self.positions[s]:
+        continue
+      self.moving.add(s)
+      if self.mistake():
+        wrong = [p for p in (0, 1, 2) if p != targets[s] and p != self.positions[s]][0]
+        self.later(self.delay(), self.move, s, wrong)
+      self.later(self.delay() * 2, self.move, s, targets[s], True)
+
+  def move(self, switch_index, position, settled=False):
+    self.set_position(switch_index, position)
+    if settled:
+      self.moving.discard(switch_index)
+      self.interact('switch', sounds=['success.wav'])
+    else:
+      self.interact('wrong_switch', sounds=['failure.wav'])
+
+  def set_position(self, switch_index, position):
+    face = self.game.io[switch_index]
+    levels = SWITCH_LEVELS[position]
+    face[0].pin.set_level(levels[0])
+    face[1].pin.set_level(levels[1])
+    self.positions[switch_index] = position
+
+class UnderPressurePlayer(Player):
+
+  def reset(self):
+    self.pressure = 0.0
+    self.mode = None
+    self.aim = 0.0
+    self.overshooting = False
+    self.entered = False
+    self.announced = False
+    self.aimed_at = 0
+    self.sampled_at = self.simulation.clock.now
+
+  def sample(self):
+    if not self.running or not self.simulation.in_play:
+      return 0
+    now = self.simulation.clock.now
+    state = self.game.state
+    if state.mode != self.mode and (state.feedback is None or state.feedback.done()):
+      self.mode = state.mode
+      self.aim_at_window(now)
+      self.overshooting = self.mistake()
+      self.entered = False
+      self.announced = False
+    elif now - self.aimed_at > REAIM_TIME and not self.overshooting:
+      self.aim_at_window(now)
+    low, high = self.module.WINDOWS[self.mode]
+    if self.overshooting and self.pressure > high + 30:
+      self.overshooting = False
+    aim = high + 100 if self.overshooting else self.aim
+    response = 1 - exp(-(now - self.sampled_at) / self.reaction_time)
+    self.sampled_at = now
+    self.pressure += (aim - self.pressure) * response
+    value = int(min(max(self.pressure + self.random.gauss(0, 5), 0), 999))
+    if value > high + HYSTERESIS and not self.announced:
+      self.interact('too_much', sounds=['bad.wav'])
+      self.announced = True
+    if low + HYSTERESIS < value < high - HYSTERESIS and not self.entered and not self.overshooting:
+      self.interact('target', sounds=['good.wav'])
+      self.entered = True
+    return value
+
+  def aim_at_window(self, now):
+    low, high = self.module.WINDOWS[self.mode]
+    self.aim = self.random.gauss((low + high) / 2, PRESSURE_PRECISION)
+    self.aimed_at = now
+
+class DialItInPlayer(Player):
+
+  def reset(self):
+    self.done = [False] * 3
+    self.mistaken = [False] * 3
+    self.busy = False
+    self.reset_dials()
+
+  def reset_dials(self):
+    self.done = [False] * 3
+    self.ready_at = self.simulation.clock.now + ARDUINO_BOOT_TIME
+    for dial in self.module.PINS:
+      for number in dial:
+        self.pin(number).set_level(False)
+
+  def gpio_changed(self, channel, value):
+    if channel == self.module.ARDUINO_RESET_PIN and value == 0:
+      self.reset_dials()
+
+  def act(self):
+    if self.busy or self.game.coms is None or all(self.done) or self.simulation.clock.now < self.ready_at:
+      return
+    dial_index = self.done.index(False)
+    self.busy = True
+    if self.mistake():
+      self.later(self.delay(), self.turn, dial_index, True)
+    else:
+      self.later(self.delay(), self.turn, dial_index, False)
+
+  def turn(self, dial_index, mistake):
+    mistake_pin, done_pin = [self.pin(n) for n in self.module.PINS[dial_index]]
+    if mistake:
+      mistake_pin.set_level(True)
+      self.mistaken[dial_index] = True
+      self.interact('wrong_dial', sounds=['unlocked.wav'])
+      self.later(self.delay(), self.recover, dial_index)
+      return
+    done_pin.set_level(True)
+    self.done[dial_index] = True
+    self.interact('dial', sounds=['locked.wav'])
+    if all(self.done) and self.game.state.level < self.module.MAX_LEVEL:
+      self.interact('all_dials', sounds=['right_positions.wav'])
+    self.busy = False
+
+  def recover(self, dial_index):
+    self.pin(self.module.PINS[dial_index][0]).set_level(False)
+    self.mistaken[dial_index] = False
+    self.busy = False
+
+  def sample(self):
+    if not self.running:
+      return 0
+    if any(self.mistaken):
+      return 18
+    if all(self.done):
+      return 16
+    return self.done.count(True)
+
+class Simulation(object):
+
+  def __init__(self, name, player, seed=0, overrides=None):
+    install()
+    self.clock = VirtualClock()
+    clock.use_clock(self.clock)
+    random.seed(seed)
+    self.name = name
+    self.module = import_module(name)
+    previous = games.get(name, self.module.game)
+    previous.close()
+    Device.pin_factory.reset()
+    self.defaults = dict((key, getattr(self.module, key)) for key in overrides or {})
+    for key, value in (overrides or {}).items():
+      setattr(self.module, key, value)
+    self.game = games[name] = type(previous)()
+    self.game.metrics_port = None
+    self.game.commands.database_url = None
+    self._replace_services()
+    self.player = player
+    self.player.attach(self)
+    self.in_play = False
+    sys.modules['RPi.GPIO'].when_output = player.gpio_changed
+    self.results = []
+
+  def init(self):
+    self.game.init()
+
+  def play_session(self):
+    game = self.game
+    started_at = self.clock.now
+    game.start_button.pin.set_level(False)
+    self.clock.call_later(START_HOLD, game.start_button.pin.set_level, (None,))
+    self.player.start()
+    result = {'game': self.name, 'timed_out': False}
+    try:
+      game.start()
+      self.in_play = True
+      while game.playing():
+        game.loop()
+        if game.interrupted():
+          break
+      game.complete()
+    except SimulationTimeout:
+      result['timed_out'] = True
+    finally:
+      self.in_play = False
+      self.player.stop()
+    result.update({
+      'score': game.state.score,
+      'strikes': game.state.strikes,
+      'completed': not result['timed_out'] and game.state.strikes < self.module.MAX_STRIKES,
+      'duration': self.clock.now - started_at
+    })
+    self.results.append(result)
+    return result
+
+  def close(self):
+    self.game.clean_up()
+    for key, value in self.defaults.items():
+      setattr(self.module, key, value)
+
+  def _replace_services(self):
+    self.game.journal.connection.close()
+    self.game.journal = ResultJournal(firebase.store, ':memory:')
+    self.game.leaderboard.close()
+    self.game.leaderboard = Leaderboard(':memory:')
+    if hasattr(self.module, 'SerialReader'):
+      self.module.SerialReader = self._open_serial
+
+  def _open_serial(self, port, baud, decoder):
+    return SimulatedArduino(self.clock, self.player.sample, isinstance(decoder, FrameDecoder), port, baud, decoder)
+
+# Functions
+
+def install():
+  if isinstance(Device.pin_factory, MockFactory) and isinstance(sys.modules.get('RPi.GPIO'), StubGPIO):
+    return
+  Device.pin_factory = MockFactory(pin_class=SwitchPin)
+  pygame = types.ModuleType('pygame')
+  pygame.mixer = StubMixer()
+  sys.modules['pygame'] = pygame
+  sys.modules['pygame.mixer'] = pygame.mixer
+  rpi = types.ModuleType('RPi')
+  rpi.GPIO = StubGPIO()
+  sys.modules['RPi'] = rpi
+  sys.modules['RPi.GPIO'] = rpi.GPIO
+  firebase.db = LocalDatabase()
+  firebase.store = LocalStore()
+
+PLAYERS = {
+  'simon_says_game': SimonSaysPlayer,
+  'follow_the_leader_game': FollowTheLeaderPlayer,
+  'push_pull_game': PushPullPlayer,
+  'under_pressure_game': UnderPressurePlayer,
+  'dial_it_in_game': DialItInPlayer
+}
+
+def simulate(name, sessions=1, seed=0, reaction_time=0.6, error_rate=0.05, verbose=False, overrides=None):
+  player = PLAYERS[name](seed, reaction_time, error_rate)
+  output = sys.stdout if verbose else open(devnull, 'w')
+  start = perf_counter()
+  try:
+    with redirect_stdout(output):
+      simulation = Simulation(name, player, seed, overrides)
+      simulation.init()
+      for _ in range(sessions):
+        simulation.play_session()
+      simulation.close()
+  finally:
+    if output is not sys.stdout:
+      output.close()
+  return simulation, perf_counter() - start
+
+# Main
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='Play whole game sessions against simulated hardware in virtual time.')
+  parser.add_argument('games', nargs='*', default=GAMES)
+  parser.add_argument('--sessions', type=int, default=5)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--reaction-time', type=float, default=0.6)
+  parser.add_argument('--error-rate', type=float, default=0.05)
+  parser.add_argument('--verbose', action='store_true')
+  args = parser.parse_args()
+  print('{:<24} {:>8} {:>8} {:>8} {:>12} {:>10} {:>10}'.format('Game', 'Sessions', 'Score', 'Strikes', 'Virtual', 'Wall', 'Speedup'))
+  for name in args.games:
+    simulation, elapsed = simulate(name, args.sessions, args.seed, args.reaction_time, args.error_rate, args.verbose)
+    results = simulation.results
+    virtual = sum(r['duration'] for r in results)
+    print('{:<24} {:>8} {:>8.1f} {:>8.1f} {:>11.0f}s {:>9.2f}s {:>9.0f}x'.format(
+      name, len(results), sum(r['score'] for r in results) / len(results), sum(r['strikes'] for r in results) / len(results),
+      virtual, elapsed, virtual / elapsed))
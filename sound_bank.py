@@ -0,0 +1,41 @@
+from collections import OrderedDict
+from metrics import Histogram
+from os import path, walk
+from pygame import mixer
+from threading import Lock
+
+# Constants
+
+MAX_SOUNDS = 64
+
+# Variables
+
+sounds = OrderedDict()
+sounds_lock = Lock()
+load_seconds = Histogram('sound_load_seconds', 'Time to load a sound file into memory.').labels()
+
+# Functions
+
+def load_sounds(sounds_path):
+  for root, dirs, files in walk(sounds_path):
+    for name in sorted(files):
+      if name.endswith('.wav'):
+        get_sound(path.join(root, name))
+
+def get_sound(sound_path):
+  key = path.normpath(sound_path)
+  with sounds_lock:
+    sound = sounds.get(key)
+    if sound is not None:
+      sounds.move_to_end(key)
+      return sound
+    with load_seconds.time():
+      sound = mixer.Sound(key)
+    sounds[key] = sound
+    while len(sounds) > MAX_SOUNDS:
+      sounds.popitem(last=False)
+  return sound
+
+def clear_sounds():
+  with sounds_lock:
+    sounds.clear()
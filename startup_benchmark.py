@@ -0,0 +1,42 @@
+from os import path
+from subprocess import PIPE, run
+from time import time
+import sys
+
+# Constants
+
+GAMES = ['simon_says_game', 'follow_the_leader_game', 'push_pull_game', 'under_pressure_game', 'dial_it_in_game']
+ROOT_PATH = path.dirname(path.abspath(__file__))
+PROBE = '''
+from importlib import import_module
+from time import time
+import sys
+spawned = float(sys.argv[1])
+game = import_module(sys.argv[2]).game
+imported = time()
+game.start_led.on()
+lit = time()
+import_module('firebase').db.reference(import_module('game_engine').GAME_DB).child(game.game_id).get()
+connected = time()
+print(imported - spawned, lit - spawned, connected - spawned)
+'''
+
+# Functions
+
+def measure(name):
+  probe = run([sys.executable, '-c', PROBE, str(time()), name], cwd=ROOT_PATH, stdout=PIPE, universal_newlines=True)
+  if probe.returncode != 0:
+    return None
+  return [float(t) for t in probe.stdout.split()[-3:]]
+
+# Main
+
+if __name__ == '__main__':
+  names = sys.argv[1:] or GAMES
+  print('{:<24} {:>10} {:>10} {:>10}'.format('Game', 'Import', 'First LED', 'Network'))
+  for name in names:
+    times = measure(name)
+    if times is None:
+      print('{:<24} {:>10}'.format(name, 'failed'))
+      continue
+    print('{:<24} {:>9.0f}ms {:>9.0f}ms {:>9.0f}ms'.format(name, *[t * 1000 for t in times]))
@@ -0,0 +1,169 @@
+from connectivity import connection
+from metrics import Counter, Gauge
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from time import monotonic
+
+# Constants
+
+FLUSH_INTERVAL = 0.5
+MAX_QUEUED = 64
+
+# Variables
+
+queued_high_water = Gauge('telemetry_queue_high_water', 'Most telemetry updates waiting to be flushed at once.', ('reference',))
+overflowed_updates = Counter('telemetry_overflows_total', 'Telemetry updates merged outside the full queue.', ('reference',))
+sent_fields = Counter('telemetry_fields_sent_total', 'Telemetry fields written to the database.', ('reference',))
+skipped_fields = Counter('telemetry_fields_skipped_total', 'Telemetry fields not written because their value was unchanged.', ('reference',))
+flush_errors = Counter('telemetry_errors_total', 'Telemetry flushes that failed.', ('reference',))
+
+# Classes
+
+class TelemetryWriter(object):
+
+  def __init__(self, reference_path, interval=FLUSH_INTERVAL, max_queued=MAX_QUEUED):
+    self.reference_path = reference_path
+    self.interval = interval
+    self.queue = Queue(max_queued)
+    self.overflow = {}
+    self.overflow_lock = Lock()
+    self.pending = {}
+    self.sent = {}
+    self.stats = {
+      'queued_max': 0,
+      'overflows': 0,
+      'flushes': 0,
+      'fields_sent': 0,
+      'fields_skipped': 0,
+      'errors': 0,
+      'flush_latency': 0
+    }
+    self.queued_max = queued_high_water.labels(reference_path)
+    self.overflows = overflowed_updates.labels(reference_path)
+    self.fields_sent = sent_fields.labels(reference_path)
+    self.fields_skipped = skipped_fields.labels(reference_path)
+    self.errors = flush_errors.labels(reference_path)
+    self.running = False
+    self.thread = None
+
+  def start(self):
+    if self.running:
+      return
+    self.running = True
+    self.thread = Thread(target=self._run, name='telemetry')
+    self.thread.daemon = True
+    self.thread.start()
+
+  def update(self, values):
+    with self.overflow_lock:
+      queued = self._put(values) if len(self.overflow) == 0 else None
+      if queued is None:
+        self.overflow.update(values)
+    if queued is None:
+      self.stats['overflows'] += 1
+      self.overflows.inc()
+      return False
+    if queued > self.stats['queued_max']:
+      self.stats['queued_max'] = queued
+      self.queued_max.set(queued)
+    return True
+
+  def flush(self, timeout=None):
+    if not self.running:
+      return False
+    done = Event()
+    self.queue.put(done)
+    return done.wait(timeout)
+
+  def close(self, timeout=None):
+    if not self.running:
+      self._merge_overflow()
+      while not self.queue.empty():
+        self.pending.update(self.queue.get_nowait())
+      self._send()
+      return
+    self.flush(timeout)
+    self.running = False
+    self.queue.put(None)
+    self.thread.join(timeout)
+
+  def _put(self, values):
+    try:
+      self.queue.put_nowait(dict(values))
+    except Full:
+      return None
+    return self.queue.qsize()
+
+  def _run(self):
+    while self.running:
+      try:
+        item = self.queue.get(timeout=self.interval)
+      except Empty:
+        item = None
+      waiters = []
+      deadline = monotonic() + self.interval
+      while item is not None:
+        if isinstance(item, Event):
+          waiters.append(item)
+          break
+        self.pending.update(item)
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+          break
+        try:
+          item = self.queue.get(timeout=remaining)
+        except Empty:
+          break
+      waiters += self._merge_overflow()
+      self._send()
+      for w in waiters:
+        w.set()
+
+  def _merge_overflow(self):
+    waiters = []
+    with self.overflow_lock:
+      if len(self.overflow) == 0:
+        return waiters
+      while True:
+        try:
+          item = self.queue.get_nowait()
+        except Empty:
+          break
+        if isinstance(item, Event):
+          waiters.append(item)
+        elif item is not None:
+          self.pending.update(item)
+      self.pending.update(self.overflow)
+      self.overflow.clear()
+    return waiters
+
+  def _send(self):
+    changes = {}
+    for key, value in self.pending.items():
+      if key in self.sent and self.sent[key] == value:
+        self.stats['fields_skipped'] += 1
+        self.fields_skipped.inc()
+      else:
+        changes[key] = value
+    self.pending = {}
+    if len(changes) == 0:
+      return
+    if not connection.ready():
+      self.pending = changes
+      return
+    start = monotonic()
+    try:
+      connection.reference(self.reference_path).update(changes)
+    except Exception:
+      self.stats['errors'] += 1
+      self.errors.inc()
+      connection.failed()
+      changes.update(self.pending)
+      self.pending = changes
+      return
+    connection.succeeded()
+    self.stats['flush_latency'] = monotonic() - start
+    self.stats['flushes'] += 1
+    self.stats['fields_sent'] += len(changes)
+    self.fields_sent.inc(len(changes))
+    self.sent.update(changes)
@@ -0,0 +1,90 @@
+from command_channel import ACK_PATH, COMMAND_PATH, CommandChannel, DONE, IGNORED, send_command
+from conftest import TIMEOUT, wait_until
+from threading import Thread
+import pytest
+import time
+
+# Constants
+
+GAME_ID = 'proto-box-test'
+REFERENCE_PATH = 'games/' + GAME_ID
+
+# Fixtures
+
+@pytest.fixture
+def channel(database):
+  commands = CommandChannel(GAME_ID, REFERENCE_PATH, database.url)
+  yield commands
+  commands.close()
+
+# Functions
+
+def connect(channel):
+  channel.start()
+  wait_until(lambda: channel.stats['connects'] > 0 and channel.synced)
+
+def issue(database, command_id, name):
+  database.database.put(REFERENCE_PATH + '/' + COMMAND_PATH, {'id': command_id, 'name': name, 'issued_at': {'.sv': 'timestamp'}})
+
+def next_command(channel):
+  commands = []
+  wait_until(lambda: commands.append(channel.poll()) or commands[-1] is not None)
+  return commands[-1]
+
+# Tests
+
+def test_stale_command_is_ignored(database, channel):
+  issue(database, 'stale', 'start')
+  connect(channel)
+  time.sleep(0.1)
+  assert channel.poll() is None
+  assert channel.seen == 'stale'
+
+def test_commands_are_dispatched_once(database, channel):
+  received = []
+  channel.when_command = received.append
+  connect(channel)
+  for i, name in enumerate(['start', 'stop', 'reset']):
+    issue(database, str(i), name)
+    command = next_command(channel)
+    assert (command.id, command.name) == (str(i), name)
+  database.database.patch(REFERENCE_PATH + '/' + COMMAND_PATH, {'name': 'reset'})
+  issue(database, 'unknown', 'explode')
+  time.sleep(0.1)
+  assert channel.poll() is None
+  assert [c.name for c in received] == ['start', 'stop', 'reset']
+  assert channel.stats['commands'] == 3
+
+def test_reconnect_does_not_replay(database, channel):
+  connect(channel)
+  issue(database, 'once', 'stop')
+  assert next_command(channel).id == 'once'
+  listener = database.database.listeners[0]
+  listener[1].put(('cancel', None))
+  wait_until(lambda: channel.stats['connects'] == 2 and len(database.database.listeners) == 2)
+  time.sleep(0.1)
+  assert channel.poll() is None
+  issue(database, 'twice', 'reset')
+  assert next_command(channel).id == 'twice'
+
+def test_acknowledgement_is_written(database, channel):
+  connect(channel)
+  ack_path = REFERENCE_PATH + '/' + ACK_PATH
+  issue(database, 'ack-me', 'start')
+  ack = channel.acknowledge(next_command(channel), IGNORED)
+  wait_until(lambda: database.database.get(ack_path) is not None)
+  written = database.database.get(ack_path)
+  assert written == ack
+  assert (written['id'], written['name'], written['status']) == ('ack-me', 'start', IGNORED)
+  assert written['handled_ms'] >= 0
+
+def test_send_command_waits_for_the_acknowledgement(database, channel):
+  connect(channel)
+  def handle():
+    channel.acknowledge(next_command(channel))
+  handler = Thread(target=handle)
+  handler.start()
+  ack, elapsed = send_command(REFERENCE_PATH, 'stop', database.url, TIMEOUT)
+  handler.join()
+  assert (ack['name'], ack['status']) == ('stop', DONE)
+  assert elapsed < TIMEOUT
@@ -0,0 +1,93 @@
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory
+from input_engine import InputEngine
+from pins import BidirectionalPin
+from threading import Timer
+import pytest
+
+# Fixtures
+
+@pytest.fixture
+def factory():
+  previous = Device.pin_factory
+  Device.pin_factory = MockFactory()
+  yield Device.pin_factory
+  Device.pin_factory.reset()
+  Device.pin_factory = previous
+
+@pytest.fixture
+def buttons(factory):
+  devices = [BidirectionalPin(n) for n in (5, 6)]
+  yield devices
+  for d in devices:
+    d.close()
+
+# Tests
+
+def test_press_and_release_are_queued_in_order(buttons):
+  engine = InputEngine()
+  engine.watch(buttons)
+  buttons[0].pin.drive_low()
+  buttons[1].pin.drive_low()
+  buttons[0].pin.drive_high()
+  events = engine.get_events()
+  assert [(e.device, e.pressed) for e in events] == [(buttons[0], True), (buttons[1], True), (buttons[0], False)]
+  assert events[0].timestamp <= events[1].timestamp <= events[2].timestamp
+  assert engine.get_events() == []
+
+def test_get_event_times_out_without_edges(buttons):
+  engine = InputEngine()
+  engine.watch(buttons)
+  assert engine.get_event(0.01) is None
+  assert engine.wait_for_events(0.01) == []
+
+def test_get_event_wakes_on_edge(buttons):
+  engine = InputEngine()
+  engine.watch(buttons)
+  timer = Timer(0.05, buttons[1].pin.drive_low)
+  timer.start()
+  event = engine.get_event(5)
+  timer.join()
+  assert event is not None
+  assert (event.device, event.pressed) == (buttons[1], True)
+
+def test_wait_for_events_returns_every_queued_event(buttons):
+  engine = InputEngine()
+  engine.watch(buttons)
+  buttons[0].pin.drive_low()
+  buttons[1].pin.drive_low()
+  assert [e.device for e in engine.wait_for_events(1)] == buttons
+
+def test_outputs_do_not_raise_events(buttons):
+  engine = InputEngine()
+  engine.watch(buttons)
+  buttons[0].as_output()
+  buttons[0].on()
+  buttons[0].off()
+  assert engine.get_events() == []
+  buttons[0].as_input()
+  buttons[0].pin.drive_low()
+  assert [(e.device, e.pressed) for e in engine.get_events()] == [(buttons[0], True)]
+
+def test_full_queue_counts_dropped_events(buttons):
+  engine = InputEngine(max_events=2)
+  engine.watch(buttons)
+  for _ in range(2):
+    buttons[0].pin.drive_low()
+    buttons[0].pin.drive_high()
+  assert len(engine.get_events()) == 2
+  assert engine.dropped == 2
+
+def test_unwatch_stops_events(buttons):
+  engine = InputEngine()
+  engine.watch(buttons)
+  engine.unwatch()
+  buttons[0].pin.drive_low()
+  assert engine.get_events() == []
+
+def test_clear_discards_pending_events(buttons):
+  engine = InputEngine()
+  engine.watch(buttons)
+  buttons[0].pin.drive_low()
+  engine.clear()
+  assert engine.get_event(0) is None
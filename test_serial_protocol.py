@@ -0,0 +1,89 @@
+from conftest import TIMEOUT, wait_until
+from serial_protocol import encode_frame, FrameDecoder, FRAME_SIZE
+import pytest
+import time
+
+# Constants
+
+MAX_VALUE = 999
+
+# Fixtures
+
+@pytest.fixture
+def binary():
+  return True
+
+@pytest.fixture
+def decoder():
+  return FrameDecoder(MAX_VALUE)
+
+# Functions
+
+def values(reader):
+  return [s[1] for s in reader.samples_since(0)]
+
+def corrupt(frame):
+  return frame[:3] + bytes([frame[3] ^ 0x01]) + frame[4:]
+
+# Tests
+
+def test_frames_are_decoded(arduino, reader, decoder):
+  for value in (0, 250, 999):
+    arduino.send(value)
+  wait_until(lambda: reader.received == 3)
+  assert values(reader) == [0, 250, 999]
+  assert decoder.stats == {'frames': 3, 'corrupt': 0, 'dropped': 0, 'out_of_range': 0}
+
+def test_corrupt_frame_is_counted_and_skipped(arduino, reader, decoder):
+  arduino.write(encode_frame(0, 100) + corrupt(encode_frame(1, 200)) + encode_frame(2, 300))
+  wait_until(lambda: reader.received == 2)
+  assert values(reader) == [100, 300]
+  assert decoder.stats['corrupt'] == 1
+  assert decoder.stats['dropped'] == 1
+  assert decoder.stats['frames'] == 2
+
+def test_decoder_resyncs_after_noise(arduino, reader, decoder):
+  arduino.write(b'\x00\xaa\x13\x55\xaa' + encode_frame(0, 10) + b'\x55\xaa\x55' + encode_frame(1, 20))
+  wait_until(lambda: reader.received == 2)
+  assert values(reader) == [10, 20]
+  assert decoder.stats['frames'] == 2
+  assert decoder.stats['dropped'] == 0
+
+def test_frame_split_across_reads(arduino, reader, decoder):
+  frame = encode_frame(0, 42)
+  arduino.write(frame[:3])
+  time.sleep(0.05)
+  assert reader.received == 0
+  arduino.write(frame[3:])
+  wait_until(lambda: reader.received == 1)
+  assert values(reader) == [42]
+
+def test_sequence_gaps_are_counted_as_dropped(arduino, reader, decoder):
+  arduino.send(1)
+  arduino.sequence += 3
+  arduino.send(2)
+  arduino.sequence = 0xFF
+  arduino.send(3)
+  arduino.send(4)
+  wait_until(lambda: reader.received == 4)
+  assert values(reader) == [1, 2, 3, 4]
+  assert decoder.stats['dropped'] == 3 + (0xFF - 5)
+  assert decoder.stats['frames'] == 4
+
+def test_out_of_range_values_are_counted_not_read(arduino, reader, decoder):
+  arduino.send(5)
+  arduino.send(MAX_VALUE + 1)
+  arduino.send(6)
+  wait_until(lambda: decoder.stats['frames'] == 3)
+  wait_until(lambda: reader.received == 2)
+  assert values(reader) == [5, 6]
+  assert decoder.stats['out_of_range'] == 1
+  assert decoder.stats['corrupt'] == 0
+
+def test_burst_of_frames_is_not_lost(arduino, reader, decoder):
+  expected = [i % (MAX_VALUE + 1) for i in range(1000)]
+  arduino.write(b''.join(encode_frame(i, v) for i, v in enumerate(expected)))
+  wait_until(lambda: reader.received == len(expected))
+  assert values(reader) == expected
+  assert decoder.stats['dropped'] == 0
+  assert len(decoder.buffer) < FRAME_SIZE
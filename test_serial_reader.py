@@ -0,0 +1,79 @@
+from conftest import TIMEOUT, wait_until
+from threading import Timer
+import serial
+import serial_reader
+
+# Functions
+
+def values(samples):
+  return [s[1] for s in samples]
+
+# Tests
+
+def test_latest_sample(arduino, reader):
+  assert reader.latest() is None
+  arduino.send(512)
+  sample = reader.wait_for_sample(0, TIMEOUT)
+  assert sample[1] == 512
+  assert reader.latest() == sample
+  arduino.send(513)
+  assert reader.wait_for_sample(sample[0], TIMEOUT)[1] == 513
+  assert reader.latest()[1] == 513
+
+def test_wait_for_sample_times_out(arduino, reader):
+  assert reader.wait_for_sample(0, 0.05) is None
+  arduino.send(1)
+  latest = reader.wait_for_sample(0, TIMEOUT)
+  assert reader.wait_for_sample(latest[0], 0.05) is None
+
+def test_samples_since(arduino, reader):
+  arduino.send(1)
+  first = reader.wait_for_sample(0, TIMEOUT)
+  arduino.write(b'2\r\n3\r\n')
+  wait_until(lambda: reader.received == 3)
+  assert values(reader.samples_since(0)) == [1, 2, 3]
+  assert values(reader.samples_since(first[0])) == [2, 3]
+  assert reader.samples_since(reader.latest()[0]) == []
+
+def test_wait_for_change_skips_repeated_values(arduino, reader):
+  arduino.send(4)
+  reader.wait_for_sample(0, TIMEOUT)
+  timer = Timer(0.05, arduino.write, (b'4\r\n4\r\n7\r\n',))
+  timer.start()
+  sample = reader.wait_for_change(TIMEOUT)
+  timer.join()
+  assert sample[1] == 7
+  assert reader.wait_for_change(0.05) is None
+
+def test_when_changed_reports_new_values(arduino, reader):
+  changes = []
+  reader.when_changed = lambda timestamp, value: changes.append(value)
+  arduino.write(b'1\r\n1\r\n')
+  wait_until(lambda: reader.received == 2)
+  arduino.send(2)
+  wait_until(lambda: reader.received == 3)
+  assert changes == [1, 2]
+
+def test_no_samples_lost_between_reads(arduino, reader):
+  expected = list(range(300))
+  arduino.play(expected, 0.001)
+  read = []
+  last = 0
+  while len(read) < len(expected):
+    sample = reader.wait_for_sample(last, TIMEOUT)
+    assert sample is not None
+    found = reader.samples_since(last)
+    read += values(found)
+    last = found[-1][0]
+  assert read == expected
+  assert reader.received == len(expected)
+
+def test_read_error_reopens_the_port(arduino, reader, monkeypatch):
+  monkeypatch.setattr(serial_reader, 'RECONNECT_INTERVAL', 0.05)
+  failing = reader.serial
+  def fail(size=1):
+    raise serial.SerialException('device reports readiness to read but returned no data')
+  failing.read = fail
+  wait_until(lambda: reader.serial is not None and reader.serial is not failing)
+  arduino.send(5)
+  assert reader.wait_for_sample(0, TIMEOUT)[1] == 5
@@ -0,0 +1,59 @@
+from conftest import TIMEOUT
+from connectivity import connection
+from telemetry import TelemetryWriter
+import pytest
+
+# Constants
+
+REFERENCE_PATH = 'games/proto-box-test'
+
+# Classes
+
+class RecordingReference(object):
+
+  def __init__(self):
+    self.values = {}
+    self.updates = 0
+
+  def update(self, values):
+    self.values.update(values)
+    self.updates += 1
+
+# Fixtures
+
+@pytest.fixture
+def reference(monkeypatch):
+  recorder = RecordingReference()
+  monkeypatch.setattr(connection, 'reference', lambda path: recorder)
+  monkeypatch.setattr(connection, 'retry_at', 0)
+  return recorder
+
+# Tests
+
+def test_unchanged_fields_are_skipped(reference):
+  writer = TelemetryWriter(REFERENCE_PATH)
+  writer.start()
+  writer.update({'status': 'Playing', 'score': 1})
+  writer.flush(TIMEOUT)
+  writer.update({'status': 'Playing', 'score': 2})
+  writer.close(TIMEOUT)
+  assert reference.values == {'status': 'Playing', 'score': 2}
+  assert writer.stats['fields_skipped'] == 1
+
+def test_latest_value_wins_after_an_overflow(reference):
+  writer = TelemetryWriter(REFERENCE_PATH, interval=0, max_queued=2)
+  for score in range(1, 6):
+    writer.update({'score': score})
+  assert writer.stats['overflows'] == 3
+  writer.start()
+  writer.close(TIMEOUT)
+  assert reference.values == {'score': 5}
+
+def test_updates_after_an_overflow_stay_in_order(reference):
+  writer = TelemetryWriter(REFERENCE_PATH, max_queued=1)
+  writer.update({'score': 1})
+  writer.update({'score': 2})
+  writer.queue.get_nowait()
+  writer.update({'score': 3})
+  writer.close()
+  assert reference.values == {'score': 3}